@@ -0,0 +1,71 @@
+"""
+Time full `fugit` runs with `--jobs 1/2/4/8` on a synthetic repo, each in a fresh
+interpreter with the cache skipped and output discarded, for plain rendering and for
+the heavier `--word-diff` and `--grep` rendering.
+
+    python benchmarks/jobs.py [--shape SHAPE] [--scale N] [--jobs N ...] [--repeat N]
+
+Only rendering runs in the worker processes: libgit2 diffing, struct conversion and
+writing the output stay in the main process, so the speedup is bounded by the share
+of the run spent rendering (and by the number of CPUs, which is printed first).
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from synthetic import SHAPES, build_repo
+
+MODES = {
+    "plain": [],
+    "word-diff": ["--word-diff"],
+    "grep": ["--grep", r"(self|value)\s+\w+"],
+}
+"""The extra flags of each rendering mode timed."""
+RUN_CLI = "import sys; from fugit.cli import run_cli; sys.argv = {argv!r}; run_cli()"
+
+
+def run_time(repo: Path, flags: list[str], repeat: int) -> float:
+    """The best wall time of `repeat` runs (including interpreter startup)."""
+    code = RUN_CLI.format(argv=["fugit", "--skip-cache", "--no-pager", *flags])
+    argv = [sys.executable, "-c", code]
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(argv, cwd=repo, stdout=subprocess.DEVNULL, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--shape", choices=list(SHAPES), default="formatter_uniform")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply repo size")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3, help="Keep the best of N runs")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+    print(f"{os.cpu_count()} CPUs, {args.shape} repo at scale {args.scale}")
+    print(f"{'mode':>10}" + "".join(f"{f'-j {jobs}':>16}" for jobs in args.jobs))
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = Path(tmp)
+        build_repo(repo, args.shape, args.scale)
+        for mode in args.modes:
+            times = [
+                run_time(repo, [*MODES[mode], "--jobs", str(jobs)], args.repeat)
+                for jobs in args.jobs
+            ]
+            cells = (f"{t:.2f}s ({times[0] / t:.1f}x)" for t in times)
+            print(f"{mode:>10}" + "".join(f"{cell:>16}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
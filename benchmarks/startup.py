@@ -0,0 +1,126 @@
+"""
+Time how long fugit takes to start, each in a fresh interpreter, as in a pre-commit
+hook that runs it many times. The bare interpreter's startup is timed too, so that
+it can be told apart from fugit's own import and parser costs.
+
+    python benchmarks/startup.py [--repeat N] [--top N]
+
+With `--top`, the modules that took longest to import (by `python -X importtime`,
+including their own imports) are listed for the full run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pygit2
+
+RUN_CLI = "import sys; from fugit.cli import run_cli; sys.argv = {argv!r}; run_cli()"
+
+SCENARIOS = {
+    "python": "pass",
+    "import fugit": "import fugit",
+    "import fugit.cli": "import fugit.cli",
+    "fugit -h": RUN_CLI.format(argv=["fugit", "-h"]),
+    "fugit (no changes)": RUN_CLI.format(argv=["fugit", "--skip-cache", "--no-pager"]),
+}
+"""Each scenario's code is run with `python -c` (with stdout discarded)."""
+
+
+def clean_repo(path: Path) -> Path:
+    """A repo with one commit and nothing staged, so the diff itself is trivial."""
+    repo = pygit2.init_repository(str(path))
+    (path / "README.md").write_text("fugit\n")
+    repo.index.add("README.md")
+    repo.index.write()
+    signature = pygit2.Signature("fugit", "fugit@example.com")
+    tree = repo.index.write_tree()
+    repo.create_commit("HEAD", signature, signature, "Initial", tree, [])
+    return path
+
+
+def run_times(code: str, cwd: Path, repeat: int) -> list[float]:
+    """Wall time of each run, measured in the interpreter from its own start time."""
+    timed = (
+        "import sys, time\nstart = time.perf_counter()\ntry:\n"
+        f"    {code}\n"
+        "finally:\n    sys.stderr.write(f'{time.perf_counter() - start}\\n')"
+    )
+    times = []
+    for _ in range(repeat):
+        started = subprocess.run(
+            [sys.executable, "-c", timed],
+            cwd=cwd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=False,
+        )
+        times.append(float(started.stderr.splitlines()[-1]))
+    return times
+
+
+def total_times(code: str, cwd: Path, repeat: int) -> list[float]:
+    """Wall time of each run including interpreter startup, as seen from outside."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=cwd,
+            stdout=subprocess.DEVNULL,
+            check=False,
+        )
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def slowest_imports(code: str, cwd: Path, top: int) -> list[tuple[int, str]]:
+    """The cumulative import time in microseconds of the `top` slowest modules."""
+    traced = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=False,
+    )
+    modules = []
+    for line in traced.stderr.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            _, cumulative, name = line.split("|")
+            modules.append((int(cumulative), name.strip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per scenario")
+    parser.add_argument("--top", type=int, default=0, help="List the slowest imports")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = clean_repo(Path(tmp))
+        print(f"{'scenario':<20}{'total (ms)':>12}{'in python (ms)':>16}")
+        for name, code in SCENARIOS.items():
+            total = statistics.median(total_times(code, cwd, args.repeat))
+            inner = statistics.median(run_times(code, cwd, args.repeat))
+            print(f"{name:<20}{1e3 * total:>12.1f}{1e3 * inner:>16.1f}")
+        if args.top:
+            full_run = "fugit (no changes)"
+            print(f"\nSlowest imports of `{full_run}`:")
+            for cumulative, module in slowest_imports(
+                SCENARIOS[full_run], cwd, args.top
+            ):
+                print(f"{cumulative / 1e3:>8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
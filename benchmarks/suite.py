@@ -0,0 +1,190 @@
+"""
+Time each phase of a diff on synthetic repos of several shapes, writing the results to
+JSON and optionally comparing them against a stored baseline run.
+
+    python benchmarks/suite.py --output results.json [--baseline baseline.json]
+
+The phases are timed separately, each on the output of the one before:
+
+- diff: libgit2 diffs HEAD against the index and builds each file's patch
+- convert: the patches are converted to msgspec structs (including their hunks)
+- highlight: each patch text is highlighted
+- render: the rendered files are submitted to the console (written to /dev/null)
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import msgspec
+import pygit2
+from synthetic import SHAPES, build_repo
+
+import fugit
+from fugit.core.diffing.logic import iter_patches, submit_rendered
+from fugit.core.diffing.pygit2 import DiffInfoPG2, diff_tree_to_index
+from fugit.core.diffing.rendering import highlight_diff, render_diff
+from fugit.core.io import FugitConsole
+
+PHASES = ("diff", "convert", "highlight", "render")
+
+
+class ShapeResult(msgspec.Struct):
+    files: int
+    lines: int
+    size: int
+    phases: dict[str, float]
+
+
+class SuiteResult(msgspec.Struct):
+    fugit: str
+    python: str
+    pygit2: str
+    machine: str
+    scale: float
+    repeat: int
+    shapes: dict[str, ShapeResult]
+
+
+def best_time(fn: Callable[[], object], repeat: int) -> tuple[float, object]:
+    """The fastest of `repeat` runs, along with the result of the last."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def render_to_console(rendered: list[tuple[int, bytes]]) -> None:
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        with FugitConsole(plain=False, use_pager=False).pager() as console:
+            for line_count, output in rendered:
+                submit_rendered(console, line_count, output)
+
+
+def time_phases(repo: pygit2.Repository, repeat: int) -> ShapeResult:
+    def diff() -> list[pygit2.Patch]:
+        return list(iter_patches(diff_tree_to_index(repo, "HEAD", [])))
+
+    def convert() -> list[DiffInfoPG2]:
+        infos = [DiffInfoPG2.from_patch(patch) for patch in patches]
+        for info in infos:
+            info.hunks  # Decoded lazily, so access them to include their conversion
+        return infos
+
+    phases = {}
+    phases["diff"], patches = best_time(diff, repeat)
+    phases["convert"], infos = best_time(convert, repeat)
+    phases["highlight"], _ = best_time(
+        lambda: [highlight_diff(info.data) for info in infos], repeat
+    )
+    rendered = [render_diff(info.overview, info.data) for info in infos]
+    phases["render"], _ = best_time(lambda: render_to_console(rendered), repeat)
+    return ShapeResult(
+        files=len(infos),
+        lines=sum(line_count for line_count, _ in rendered),
+        size=sum(len(info.data) for info in infos),
+        phases=phases,
+    )
+
+
+def run_suite(
+    workdir: Path, shapes: list[str], scale: float, repeat: int
+) -> SuiteResult:
+    results = {}
+    for shape in shapes:
+        repo_path = workdir / f"{shape}-{scale}"
+        if (repo_path / ".git").exists():
+            repo = pygit2.Repository(str(repo_path))  # Reuse a repo built before
+        else:
+            repo = build_repo(repo_path, shape, scale=scale)
+        results[shape] = time_phases(repo, repeat)
+    return SuiteResult(
+        fugit=fugit.__version__,
+        python=platform.python_version(),
+        pygit2=pygit2.__version__,
+        machine=platform.machine(),
+        scale=scale,
+        repeat=repeat,
+        shapes=results,
+    )
+
+
+def compare(result: SuiteResult, baseline: SuiteResult, tolerance: float) -> bool:
+    """Print each phase's time relative to the baseline, giving whether none regressed."""
+    passed = True
+    print(f"{'shape':<20}{'phase':<12}{'baseline':>10}{'current':>10}{'ratio':>8}")
+    for shape, shape_result in result.shapes.items():
+        if (base := baseline.shapes.get(shape)) is None:
+            continue
+        for phase, seconds in shape_result.phases.items():
+            if (base_seconds := base.phases.get(phase)) is None:
+                continue
+            ratio = seconds / base_seconds
+            regressed = ratio > 1 + tolerance
+            passed &= not regressed
+            flag = "  REGRESSED" if regressed else ""
+            print(
+                f"{shape:<20}{phase:<12}{base_seconds:>10.3f}{seconds:>10.3f}"
+                f"{ratio:>8.2f}{flag}"
+            )
+    return passed
+
+
+def print_result(result: SuiteResult) -> None:
+    print(f"{'shape':<20}{'files':>7}{'lines':>10}{'MiB':>7}", end="")
+    print("".join(f"{phase:>11}" for phase in PHASES))
+    for shape, shape_result in result.shapes.items():
+        mib = shape_result.size / 2**20
+        print(
+            f"{shape:<20}{shape_result.files:>7}{shape_result.lines:>10}{mib:>7.1f}",
+            end="",
+        )
+        print("".join(f"{shape_result.phases[phase]:>11.3f}" for phase in PHASES))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--shapes", nargs="+", choices=list(SHAPES), default=list(SHAPES)
+    )
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply repo sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="Keep the best of N runs")
+    parser.add_argument("--workdir", type=Path, help="Build (and reuse) repos here")
+    parser.add_argument(
+        "--output", type=Path, help="Write the results to this JSON file"
+    )
+    parser.add_argument("--baseline", type=Path, help="Compare against this JSON file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Fail if any phase is slower than the baseline by more than this fraction",
+    )
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or Path(tmp)
+        result = run_suite(workdir, args.shapes, args.scale, args.repeat)
+    print_result(result)
+    if args.output:
+        args.output.write_bytes(msgspec.json.format(msgspec.json.encode(result)))
+    if args.baseline:
+        baseline = msgspec.json.decode(args.baseline.read_bytes(), type=SuiteResult)
+        print()
+        if not compare(result, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Build synthetic git repositories of a given shape with pygit2, for benchmarking.
+
+Each shape commits a tree and then stages changes to it in the index, which is what a
+plain `fugit` diffs. Blobs and index entries are written directly, without checking
+files out into a working tree, so even large repos build in a few seconds.
+"""
+
+from __future__ import annotations
+
+import random
+from collections.abc import Callable
+from pathlib import Path
+
+from pygit2 import (
+    GIT_FILEMODE_BLOB,
+    IndexEntry,
+    Repository,
+    Signature,
+    init_repository,
+)
+
+__all__ = ("SHAPES", "build_repo", "code_line")
+
+WORDS = "self value config return if for in None path = .".split()
+
+Files = dict[str, list[str]]
+
+
+def code_line(rng: random.Random) -> str:
+    indent = " " * 4 * rng.randrange(4)
+    return indent + " ".join(rng.choices(WORDS, k=rng.randrange(1, 10)))
+
+
+def edit_lines(rng: random.Random, lines: list[str], every: int) -> list[str]:
+    """Rewrite about one in every `every` lines, as scattered small edits."""
+    return [code_line(rng) if rng.randrange(every) == 0 else line for line in lines]
+
+
+def many_small(rng: random.Random, scale: float) -> tuple[Files, Files]:
+    """Many short files, half of them with a one or two line edit."""
+    before = {
+        f"src/pkg{i % 50}/mod{i}.py": [code_line(rng) for _ in range(20)]
+        for i in range(int(5000 * scale))
+    }
+    after = {
+        path: edit_lines(rng, lines, every=15) if i % 2 else lines
+        for i, (path, lines) in enumerate(before.items())
+    }
+    return before, after
+
+
+def few_huge(rng: random.Random, scale: float) -> tuple[Files, Files]:
+    """A handful of very long files with edits scattered all through them."""
+    before = {
+        f"data/table{i}.py": [code_line(rng) for _ in range(int(50_000 * scale))]
+        for i in range(5)
+    }
+    after = {path: edit_lines(rng, lines, every=40) for path, lines in before.items()}
+    return before, after
+
+
+def rename_heavy(rng: random.Random, scale: float) -> tuple[Files, Files]:
+    """Most files moved to a new package, some also lightly edited."""
+    before = {
+        f"old/mod{i}.py": [code_line(rng) for _ in range(60)]
+        for i in range(int(1000 * scale))
+    }
+    after = {}
+    for i, (path, lines) in enumerate(before.items()):
+        if i % 5 == 0:
+            after[path] = lines
+            continue
+        after[path.replace("old/", "new/")] = (
+            edit_lines(rng, lines, 30) if i % 2 else lines
+        )
+    return before, after
+
+
+def formatter_uniform(rng: random.Random, scale: float) -> tuple[Files, Files]:
+    """The same mechanical reformatting applied to every file, as a linter switch does."""
+    before = {
+        f"lib/mod{i}.py": [
+            "x=[1,2]" if j % 10 == 0 else code_line(rng) for j in range(100)
+        ]
+        for i in range(int(2000 * scale))
+    }
+    after = {
+        path: [line.replace("x=[1,2]", "x = [1, 2]") for line in lines]
+        for path, lines in before.items()
+    }
+    return before, after
+
+
+SHAPES: dict[str, Callable[[random.Random, float], tuple[Files, Files]]] = {
+    "many_small": many_small,
+    "few_huge": few_huge,
+    "rename_heavy": rename_heavy,
+    "formatter_uniform": formatter_uniform,
+}
+
+
+def stage_files(repo: Repository, files: Files) -> None:
+    """Replace the index contents with these files, writing their blobs."""
+    index = repo.index
+    index.clear()
+    for path, lines in files.items():
+        blob_id = repo.create_blob("\n".join(lines).encode() + b"\n")
+        index.add(IndexEntry(path, blob_id, GIT_FILEMODE_BLOB))
+    index.write()
+
+
+def build_repo(path: Path, shape: str, scale: float = 1.0, seed: int = 0) -> Repository:
+    """
+    Create a repo at `path` whose HEAD commit holds the shape's files as they were
+    before, with the files as they are after staged in the index.
+    """
+    rng = random.Random(seed)
+    before, after = SHAPES[shape](rng, scale)
+    repo = init_repository(path)
+    stage_files(repo, before)
+    sig = Signature("fugit", "fugit@example.com")
+    repo.create_commit("HEAD", sig, sig, "Before", repo.index.write_tree(), [])
+    stage_files(repo, after)
+    return repo
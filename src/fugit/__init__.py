@@ -1,5 +1,17 @@
-from .core import diff
+from typing import TYPE_CHECKING
 
 __version__ = "0.3.5"
 
-__all__ = ("diff",)
+if TYPE_CHECKING:
+    from .core import adiff, diff, iter_diff
+
+__all__ = ("diff", "iter_diff", "adiff")
+
+
+def __getattr__(name: str):
+    """Import the diffing machinery (and with it pygit2) only once it is used."""
+    if name in __all__:
+        from . import core
+
+        return getattr(core, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,16 +1,17 @@
 from __future__ import annotations
 
+import sys
 from argparse import ArgumentParser
-from typing import Annotated, Callable, get_args, get_origin, get_type_hints
+from typing import Annotated, Callable, Literal, get_args, get_origin, get_type_hints
 
 import argh
 import msgspec
-from pysnooper import snoop
+from argh.dispatching import ArghNamespace
 
-from ..core.diffing import load_diff
+from ..core.daemon_socket import owned_socket, socket_path
 from ..core.error_handlers import CaptureInvalidConfigExit
-from ..core.errors import FugitMisconfigurationExit
-from ..interfaces import DiffConfig, configure_global_console
+from ..core.errors import FugitMisconfigurationExit, FugitUserError
+from ..interfaces import DiffConfig, configure_global_console, profiling_requested
 
 __all__ = ("run_cli",)
 
@@ -19,27 +20,59 @@ def stringify_hint(type_hint) -> str:
     match type_hint:
         case type():
             hint = type_hint.__name__
+        case _ if get_origin(type_hint) is Literal:
+            hint = type(get_args(type_hint)[0]).__name__  # The choices are listed
         case _:
             hint = str(type_hint)
     return hint
 
 
-def populate_parser_descriptions(parser: ArgumentParser, struct: Callable) -> None:
-    """Fill out the help attribute and instantiate any field default factories."""
+def literal_choices(type_hint) -> tuple | None:
+    """The values a `Literal` type hint allows, to be given as the flag's choices."""
+    return get_args(type_hint) if get_origin(type_hint) is Literal else None
+
+
+def field_descriptions(struct: Callable) -> dict[str, tuple[str, str, tuple | None]]:
+    """
+    The description, type hint string and choices of each field, reflected from the
+    struct's (annotated) type hints. This takes about 0.2ms, negligible next to the
+    interpreter startup, so it's not worth precomputing.
+    """
     hints = get_type_hints(struct, include_extras=True)
+    descriptions = {}
+    for field in struct.__struct_fields__:
+        if get_origin(hints[field]) is Annotated:
+            type_hint, meta = get_args(hints[field])
+            description = meta.description + " "
+        else:
+            # If the type is unannotated no meta so no description
+            type_hint, description = hints[field], ""
+        descriptions[field] = (
+            description,
+            stringify_hint(type_hint),
+            literal_choices(type_hint),
+        )
+    return descriptions
+
+
+def populate_parser_descriptions(parser: ArgumentParser, struct: Callable) -> None:
+    """
+    Fill out the help attribute, restrict `Literal` fields to their values, and
+    instantiate any field default factories.
+    """
+    descriptions = field_descriptions(struct)
     for action in parser._actions:
-        if (flag := action.dest) in struct.__struct_fields__:
-            if get_origin(hints[flag]) is Annotated:
-                type_hint, meta = get_args(hints[flag])
-                desc = meta.description + " "
-                hint = stringify_hint(type_hint)
-            else:
-                # If the type is unannotated no meta so no description
-                desc = ""
-                hint = stringify_hint(hints[flag])
+        if (flag := action.dest) in descriptions:
+            desc, hint, choices = descriptions[flag]
             match action.default:
                 case msgspec._core.Factory() as factory_manager:
                     action.default = factory_manager.factory()
+            if isinstance(action.default, list):
+                # Take one or more values per flag, accumulating over repeated flags
+                action.__class__ = parser._registry_get("action", "extend")
+                action.type, action.nargs = None, "+"
+            if choices:
+                action.choices = choices
             action.help = f"{desc}(type: {hint}, default: {action.default})"
 
 
@@ -60,24 +93,55 @@ def dispatch_command(cmd: Callable, **argh_kwargs):
     populate_parser_descriptions(parser, cmd)
     with CaptureInvalidConfigExit():
         _, namespace = argh.parse_and_resolve(parser=parser, **argh_kwargs)
-    ns_kwargs = vars(namespace)
-    ns_kwargs.pop("_functions_stack")
-    result = cmd(**ns_kwargs)
+        ns_kwargs = vars(namespace)
+        ns_kwargs.pop("_functions_stack")
+        try:
+            result = cmd(**ns_kwargs)
+        except FugitUserError as exc:
+            parser.error(exc.message)  # Reported like an invalid argument
     return result
 
 
-def configure(**argh_kwargs) -> DiffConfig:
+def split_pathspec(argv: list[str]) -> tuple[list[str], list[str]]:
+    """Separate the arguments after a "--" (as in `git diff -- <path>...`) as paths."""
+    if "--" not in argv:
+        return argv, []
+    split = argv.index("--")
+    return argv[:split], argv[split + 1 :]
+
+
+def configure(argv: list[str] | None = None, **argh_kwargs) -> DiffConfig:
     """Runs argh CLI using `sys.argv`, raises `SystemExit` if the config is invalid"""
-    return dispatch_command(DiffConfig, **argh_kwargs)
+    argv, pathspec = split_pathspec(sys.argv[1:] if argv is None else argv)
+    if pathspec:
+        argh_kwargs["namespace"] = ArghNamespace(pathspec=pathspec)
+    return dispatch_command(DiffConfig, argv=argv, **argh_kwargs)
 
 
 def run_cli() -> None:
+    if sys.argv[1:] == ["--serve"]:
+        from ..core.daemon import serve
+
+        return serve()
     try:
         config = configure()
     except FugitMisconfigurationExit:
         configure(argv=["-h"])
     else:
+        path = socket_path()
+        daemon = path is not None and owned_socket(path)
+        if daemon and not (config.debug or profiling_requested(config)):
+            # Only imported (with its socket modules) if there is a daemon to ask
+            from ..core.daemon import request_diff, write_reply
+
+            if (output := request_diff(config, path=path)) is not None:
+                return write_reply(config, output)
+        # Deferred so that `-h` and invalid configs exit before pygit2 is even imported
+        from ..core.diffing import load_diff
+
         if config.debug:
+            from pysnooper import snoop
+
             main = snoop(depth=1, relative_time=True)(load_diff)
         else:
             main = load_diff
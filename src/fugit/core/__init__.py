@@ -1,5 +1,21 @@
-from .diffing import diff
-
 # from .parsing import FileDiff, RepoDiff
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .diffing import diff, iter_diff
+    from .diffing.asynchronous import adiff
+
+__all__ = ("diff", "iter_diff", "adiff")  # "FileDiff", "RepoDiff")
+
+
+def __getattr__(name: str):
+    """Defer importing the diffing modules, so the console and config load cheaply."""
+    if name in ("diff", "iter_diff"):
+        from . import diffing
+
+        return getattr(diffing, name)
+    if name == "adiff":
+        from .diffing.asynchronous import adiff
 
-__all__ = ("diff",)  # "FileDiff", "RepoDiff")
+        return adiff
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
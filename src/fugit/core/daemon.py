@@ -0,0 +1,339 @@
+"""
+A long-lived `fugit --serve` process, which keeps repositories open and their converted
+diffs in memory, and a client the CLI uses to hand its diff off to it. Requests and
+replies are msgpack frames over a Unix domain socket. The daemon acknowledges a request
+as it takes it up, then streams the output in frames as it is rendered, and ends with a
+frame marking it done (or failed). If no daemon takes up the request, or it fails before
+producing any output, the CLI just runs the diff itself.
+"""
+
+from __future__ import annotations
+
+import os
+import signal
+import socket
+import sys
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from contextlib import redirect_stdout, suppress
+from io import BufferedIOBase, BufferedWriter, RawIOBase, TextIOWrapper
+from socketserver import StreamRequestHandler, UnixStreamServer
+from typing import TYPE_CHECKING
+
+import msgspec
+from msgspec import Struct
+
+from .. import __version__
+from ..interfaces import DiffConfig, configure_global_console
+from . import io
+from .daemon_socket import owned_socket, socket_path
+from .error_handlers import SuppressBrokenPipeError
+from .paging import TerminalDimensions
+
+if TYPE_CHECKING:
+    from pygit2 import Repository
+
+__all__ = (
+    "DaemonRequest",
+    "DaemonReply",
+    "DiffServer",
+    "socket_path",
+    "request_diff",
+    "write_reply",
+    "serve",
+)
+
+FRAME_HEADER = 4
+"""Each frame is prefixed by its length as a 4 byte little-endian unsigned int."""
+TEXT_FORMATS = ("text", "stat", "numstat", "cluster")
+"""Output formats written via the console (and pager) rather than as binary records."""
+MAX_MEMO_SIZE = 64 * 2**20
+"""Bytes of rendered output the daemon keeps to answer repeated identical requests."""
+OUTPUT_CHUNK = 2**16
+"""Bytes of output the daemon buffers before sending them on in a frame."""
+CONNECT_TIMEOUT = 1.0
+"""Seconds to wait for the daemon to accept a connection."""
+REPLY_TIMEOUT = 2.0
+"""Seconds to wait for the daemon to take up the request. It serves one request at a
+time, so this bounds the wait behind another client's diff (or on a hung daemon), after
+which the diff is run in-process instead. Once taken up the output has no time limit."""
+
+
+class DaemonRequest(Struct):
+    config: DiffConfig
+    terminal: tuple[int, int] | None = None
+    """The client's terminal columns and lines, if it has one."""
+    version: str = __version__
+
+
+class DaemonReply(Struct):
+    """A frame of the reply: a chunk of output, else the end of it (or a failure)."""
+
+    output: bytes = b""
+    done: bool = False
+    failed: bool = False
+
+
+def write_frame(stream: BufferedIOBase, payload: bytes) -> None:
+    stream.write(len(payload).to_bytes(FRAME_HEADER, "little"))
+    stream.write(payload)
+    stream.flush()
+
+
+def read_frame(stream: BufferedIOBase) -> bytes | None:
+    header = stream.read(FRAME_HEADER)
+    if len(header) < FRAME_HEADER:
+        return None
+    return stream.read(int.from_bytes(header, "little"))
+
+
+def terminal_size() -> tuple[int, int] | None:
+    try:
+        return tuple(os.get_terminal_size())
+    except OSError:
+        return None
+
+
+def read_reply(stream: BufferedIOBase) -> DaemonReply | None:
+    if (payload := read_frame(stream)) is None:
+        return None
+    return msgspec.msgpack.decode(payload, type=DaemonReply)
+
+
+def send_reply(stream: BufferedIOBase, reply: DaemonReply) -> None:
+    write_frame(stream, msgspec.msgpack.encode(reply))
+
+
+def request_diff(config: DiffConfig, path: str | None = None) -> Iterator[bytes] | None:
+    """
+    Send the diff to a daemon listening on the socket at `path` (by default that of
+    `socket_path`) and give its output as it streams in, or None if there is no daemon
+    to take up the request within `REPLY_TIMEOUT`, or it fails before giving any output
+    (in which case the diff should be run in-process). Sockets not owned by this user
+    (with mode 0600) are never connected to.
+    """
+    path = path or socket_path()
+    if path is None or not owned_socket(path):
+        return None
+    config = msgspec.structs.replace(config, repo=os.path.abspath(config.repo))
+    request = DaemonRequest(config, terminal=terminal_size())
+    client = socket.socket(socket.AF_UNIX)
+    try:
+        client.settimeout(CONNECT_TIMEOUT)
+        client.connect(path)
+        client.settimeout(REPLY_TIMEOUT)
+        stream = client.makefile("rwb")
+        write_frame(stream, msgspec.msgpack.encode(request))
+        if read_reply(stream) is None:  # Not acknowledged
+            raise ConnectionError("No reply from the daemon")
+        client.settimeout(None)
+        # Read on to the first output, so a diff failing before any can be rerun
+        while (reply := read_reply(stream)) is not None and not reply.failed:
+            if reply.output or reply.done:
+                return stream_output(client, stream, reply)
+    except OSError:
+        pass  # A stale socket left by a killed daemon, or a timeout
+    client.close()
+    return None
+
+
+def stream_output(
+    client: socket.socket,
+    stream: BufferedIOBase,
+    reply: DaemonReply,
+) -> Iterator[bytes]:
+    """Give the output of each reply frame from `reply` on, until the one marked done."""
+    with client, stream:
+        while not reply.done:
+            yield reply.output
+            try:
+                reply = read_reply(stream)
+            except OSError:
+                reply = None
+            if reply is None or reply.failed:
+                raise SystemExit("fugit: the daemon failed partway through the output")
+
+
+def write_reply(config: DiffConfig, output: Iterable[bytes]) -> None:
+    """Write the daemon's output as the diff would have been, paging any text."""
+    if config.output_format not in TEXT_FORMATS:
+        with SuppressBrokenPipeError():
+            for chunk in output:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        return
+    # The daemon already applied the file limit, so don't pass it on to the console
+    console = io.FugitConsole(plain=config.plain, use_pager=not config.no_pager)
+    with console.pager() as console:
+        for chunk in output:
+            console.line_count += chunk.count(b"\n")
+            console.submit(chunk)
+
+
+class ClientGone(Exception):
+    """The client stopped reading the reply (e.g. its pager was quit)."""
+
+
+class ReplyStream(RawIOBase):
+    """
+    Send each write (from a `BufferedWriter` on top) to the client as a reply frame of
+    up to `OUTPUT_CHUNK` bytes, keeping a copy of the output for the memo until it
+    outgrows it.
+    """
+
+    def __init__(self, wfile: BufferedIOBase):
+        self.wfile = wfile
+        self.chunks: list[bytes] | None = []
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        # A short write, which the `BufferedWriter` follows up with the rest
+        chunk = bytes(data[:OUTPUT_CHUNK])
+        try:
+            send_reply(self.wfile, DaemonReply(output=chunk))
+        except OSError as exc:
+            # Not a BrokenPipeError, which the console would take for its own stdout's
+            raise ClientGone() from exc
+        if self.chunks is not None:
+            self.size += len(chunk)
+            if self.size <= MAX_MEMO_SIZE:
+                self.chunks.append(chunk)
+            else:
+                self.chunks = None
+        return len(chunk)
+
+
+class DiffRequestHandler(StreamRequestHandler):
+    server: DiffServer
+
+    def handle(self) -> None:
+        if (payload := read_frame(self.rfile)) is None:
+            return
+        try:
+            request = msgspec.msgpack.decode(payload, type=DaemonRequest)
+            send_reply(self.wfile, DaemonReply())  # Taken up
+            self.server.render(request, self.wfile)
+            reply = DaemonReply(done=True)
+        except (Exception, SystemExit):
+            # If there was no output yet, the client reruns the diff itself (which
+            # reports any error as usual)
+            reply = DaemonReply(failed=True)
+        with suppress(OSError):  # The client may have timed out and gone
+            send_reply(self.wfile, reply)
+
+
+class DiffServer(UnixStreamServer):
+    """
+    Serve one request at a time (the console and stdout are process-wide), reusing an
+    open `Repository` per path and an in-memory diff cache. Identical requests against
+    an unchanged revision tree and index are answered from a memo of their output.
+    """
+
+    def __init__(self, path: str):
+        from .diffing.cache import MemoryDiffCache
+
+        # Only the user may connect, as they could read any repo
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, DiffRequestHandler)
+        finally:
+            os.umask(umask)
+        self.repositories: dict[str, Repository] = {}
+        self.cache = MemoryDiffCache(limit=DiffConfig().max_cache_size * 2**20)
+        self.outputs: OrderedDict[tuple, bytes] = OrderedDict()
+
+    def repository(self, path: str) -> Repository:
+        from pygit2 import Repository
+
+        if (repo := self.repositories.get(path)) is None:
+            repo = self.repositories[path] = Repository(path)
+        else:
+            repo.index.read(False)  # Reload the index if it changed on disk
+        return repo
+
+    def render(self, request: DaemonRequest, wfile: BufferedIOBase) -> None:
+        """Stream the request's output to `wfile`, from the memo if it holds it."""
+        if request.version != __version__:
+            raise ValueError(f"Client is fugit {request.version}, not {__version__}")
+        config = msgspec.structs.replace(request.config, no_pager=True)
+        from .diffing.logic import cache_key
+
+        repo = self.repository(config.repo)
+        memo_key = None
+        if not (config.range or config.skip_cache):
+            diff_key = cache_key(self.cache, repo, config)
+            memo_key = (diff_key, msgspec.msgpack.encode(config), request.terminal)
+            if (output := self.outputs.get(memo_key)) is not None:
+                self.outputs.move_to_end(memo_key)
+                for start in range(0, len(output), OUTPUT_CHUNK):
+                    chunk = output[start : start + OUTPUT_CHUNK]
+                    send_reply(wfile, DaemonReply(output=chunk))
+                return
+        chunks = self.run_diff(repo, config, request.terminal, wfile)
+        if memo_key is not None and chunks is not None:
+            self.memoise(memo_key, b"".join(chunks))
+
+    def run_diff(
+        self,
+        repo: Repository,
+        config: DiffConfig,
+        terminal: tuple[int, int] | None,
+        wfile: BufferedIOBase,
+    ) -> list[bytes] | None:
+        """
+        Render the diff, streaming its output to `wfile` in frames of up to
+        `OUTPUT_CHUNK` bytes. Give the output's chunks back if it fits in the memo.
+        """
+        from .diffing.logic import load_diff_pygit2
+
+        reply_stream = ReplyStream(wfile)
+        buffer = BufferedWriter(reply_stream, OUTPUT_CHUNK)
+        stdout = TextIOWrapper(buffer, encoding="utf-8", newline="")
+        with redirect_stdout(stdout):
+            configure_global_console(config)
+            if terminal is not None:
+                size = os.terminal_size(terminal)
+                io.fugit_console.terminal = TerminalDimensions(size)
+            else:
+                io.fugit_console.terminal = None
+            load_diff_pygit2(config, repo=repo, cache=self.cache)
+            stdout.flush()
+        return reply_stream.chunks
+
+    def memoise(self, key: tuple, output: bytes) -> None:
+        self.outputs[key] = output
+        total = sum(map(len, self.outputs.values()))
+        while total > MAX_MEMO_SIZE and len(self.outputs) > 1:
+            _, evicted = self.outputs.popitem(last=False)
+            total -= len(evicted)
+
+
+def daemon_running(path: str) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX) as client:
+            client.connect(path)
+    except OSError:
+        return False
+    return True
+
+
+def serve(path: str | None = None) -> None:
+    """Serve diffs on the socket at `path` (by default `socket_path`) until killed."""
+    if (path := path or socket_path()) is None:
+        sys.exit("fugit: set $XDG_RUNTIME_DIR or $FUGIT_SOCKET to serve")
+    if os.path.exists(path):
+        if daemon_running(path):
+            sys.exit(f"fugit: a daemon is already serving on {path}")
+        os.unlink(path)  # Left by a daemon that did not shut down cleanly
+    # Exit via SystemExit on SIGTERM too, so the socket is removed on the way out
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with DiffServer(path) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
@@ -0,0 +1,41 @@
+"""
+Locating the daemon's socket, kept apart from the daemon itself so that the CLI can
+check for one without importing its client.
+"""
+
+from __future__ import annotations
+
+import os
+import stat
+
+__all__ = ("socket_path", "owned_socket")
+
+
+def socket_path() -> str | None:
+    """
+    `$FUGIT_SOCKET` if set, else a per-user socket in the runtime dir. There is no
+    fallback to a shared temp dir (where another user could create the socket first),
+    so without either there is no daemon and diffs run in-process.
+    """
+    if path := os.environ.get("FUGIT_SOCKET"):
+        return path
+    if runtime_dir := os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(runtime_dir, f"fugit-{os.getuid()}.sock")
+    return None
+
+
+def owned_socket(path: str) -> bool:
+    """
+    Whether `path` is a socket which only this user can use, as a daemon serving
+    would create it. Any other socket could be another user's, who would then be sent
+    the config and have their reply written to the terminal.
+    """
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return (
+        stat.S_ISSOCK(info.st_mode)
+        and info.st_uid == os.getuid()
+        and stat.S_IMODE(info.st_mode) == 0o600
+    )
@@ -1,3 +1,3 @@
-from .logic import diff, load_diff
+from .logic import diff, iter_diff, load_diff
 
-__all__ = ("load_diff", "diff")
+__all__ = ("load_diff", "diff", "iter_diff")
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+from threading import Event, Thread
+
+import msgspec
+
+from ...interfaces import DiffConfig
+from .logic import iter_diff
+from .pygit2 import DiffInfoPG2
+
+__all__ = ("adiff", "aload_diff_infos")
+
+QUEUE_SIZE = 16
+"""Files converted ahead of the consumer before the worker thread waits for it."""
+
+
+class _Finished:
+    """Sentinel sent by the worker thread after the last file (or its exception)."""
+
+    def __init__(self, error: BaseException | None = None):
+        self.error = error
+
+
+def adiff(**config) -> AsyncIterator[DiffInfoPG2]:
+    """Narrow the input type to DiffConfig type for `aload_diff_infos`."""
+    return aload_diff_infos(msgspec.convert(config, type=DiffConfig))
+
+
+async def aload_diff_infos(
+    config: DiffConfig,
+    maxsize: int = QUEUE_SIZE,
+) -> AsyncIterator[DiffInfoPG2]:
+    """
+    Run `iter_diff` in a worker thread, so libgit2 never blocks the event loop, receiving files
+    through a queue of at most `maxsize`: the worker waits while it is full, so it
+    only ever gets that far ahead of the consumer. Each call has its own thread and
+    repository handle, so several repos can be diffed concurrently. If the consumer
+    stops early (or is cancelled) the worker stops before generating the next patch.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[DiffInfoPG2 | _Finished] = asyncio.Queue(maxsize)
+    stop = Event()
+
+    def put(item: DiffInfoPG2 | _Finished) -> bool:
+        """Wait for space in the queue, unless the consumer has stopped."""
+        if stop.is_set():
+            return False
+        try:
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+        except RuntimeError:
+            return False  # The event loop was closed
+        return not stop.is_set()
+
+    def work() -> None:
+        diff_infos = iter_diff(config)
+        try:
+            for diff_info in diff_infos:
+                if not put(diff_info):
+                    return
+        except BaseException as error:
+            put(_Finished(error))
+        else:
+            put(_Finished())
+        finally:
+            diff_infos.close()  # e.g. so an unfinished cache entry is discarded
+
+    worker = Thread(target=work, name=f"fugit-adiff-{config.repo}", daemon=True)
+    worker.start()
+    try:
+        while not isinstance(item := await queue.get(), _Finished):
+            yield item
+        if item.error is not None:
+            raise item.error
+    finally:
+        stop.set()
+        while not queue.empty():
+            queue.get_nowait()  # Unblock a worker waiting for space, so it sees `stop`
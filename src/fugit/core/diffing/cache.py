@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from contextlib import suppress
+from pathlib import Path
+from typing import BinaryIO
+
+import msgspec
+from msgspec import Raw, Struct
+from pygit2 import Repository, Tree
+
+from .pygit2 import DiffInfoPG2
+from .pygit2.structures import DiffDelta, StoredHunk
+
+__all__ = ("DiffCache", "MemoryDiffCache", "cache_dir")
+
+CACHE_FORMAT = 6
+"""Bump to invalidate existing cache entries when the record layout changes."""
+
+FRAME_HEADER = 4
+"""Each record is prefixed by its length as a 4 byte little-endian unsigned int."""
+NO_HUNKS = Raw(msgspec.msgpack.encode(None))
+"""The (undecoded) hunks field of a record that stored none."""
+
+
+class CachedPatch(Struct, array_like=True):
+    """
+    A file's delta and patch text, and its hunks only if they were decoded for the
+    run that wrote it (which text output never does): the rest are parsed from the
+    patch text if ever needed.
+    """
+
+    delta: DiffDelta
+    data: bytes
+    hunks: list[StoredHunk] | None
+
+
+class CachedPatchRecord(Struct, array_like=True):
+    """Decoding counterpart of `CachedPatch` which leaves the hunks undecoded."""
+
+    delta: DiffDelta
+    data: bytes
+    hunks: Raw
+
+
+def cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "fugit"
+
+
+def index_checksum(repo: Repository, hash_size: int) -> bytes:
+    """The trailing checksum of the index file, which changes whenever the index does."""
+    try:
+        with open(Path(repo.path) / "index", "rb") as index_file:
+            index_file.seek(-hash_size, os.SEEK_END)
+            return index_file.read()
+    except OSError:
+        return b""  # No index has been written yet
+
+
+class DiffCache:
+    """
+    Persist the converted diff structs of a revision-to-index diff, keyed on the
+    resolved revision tree OID and the index checksum, so that a repeat diff of the
+    same staged index skips libgit2 patch generation entirely. Entries are evicted
+    least recently used first once the cache directory exceeds `limit` bytes.
+    """
+
+    root: Path
+    limit: int
+
+    def __init__(self, root: Path, limit: int):
+        self.root = root
+        self.limit = limit
+        self.encoder = msgspec.msgpack.Encoder()
+        self.decoder = msgspec.msgpack.Decoder(CachedPatchRecord)
+
+    def key(
+        self,
+        repo: Repository,
+        revision: str,
+        change_type: list[str],
+        pathspec: list[str],
+        conversion: tuple[int, ...] = (),
+    ) -> str:
+        """
+        The tree and index identify the diff, and the filters and `conversion` settings
+        (rename detection and file size limits) what it was converted into.
+        """
+        tree = repo.revparse_single(revision).peel(Tree)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{CACHE_FORMAT}:{repo.path}:".encode())
+        digest.update(tree.id.raw)
+        digest.update(index_checksum(repo, hash_size=len(tree.id.raw)))
+        digest.update(",".join(sorted(change_type)).encode())
+        digest.update(b"\0".join(path.encode() for path in sorted(pathspec)))
+        if any(conversion):
+            digest.update(("\0" + ":".join(map(str, conversion))).encode())
+        return digest.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.root / f"{key}.msgpack"
+
+    def read(self, key: str) -> Iterator[DiffInfoPG2] | None:
+        path = self.path(key)
+        try:
+            # Opened now so that the entry can still be read if another writer evicts it
+            cache_file = open(path, "rb")
+        except OSError:
+            return None  # Not cached, or the cache dir can't be read
+        with suppress(OSError):
+            os.utime(path)  # Mark as recently used
+        return self._read_records(cache_file)
+
+    def _read_records(self, cache_file: BinaryIO) -> Iterator[DiffInfoPG2]:
+        """
+        Decode the entry's records in turn. A corrupt entry is removed (so the next
+        diff rewrites it) before the `msgspec.DecodeError` is raised.
+        """
+        with cache_file:
+            while header := cache_file.read(FRAME_HEADER):
+                size = int.from_bytes(header, "little")
+                try:
+                    record = self.decoder.decode(cache_file.read(size))
+                except msgspec.DecodeError:
+                    with suppress(OSError):
+                        os.unlink(cache_file.name)
+                    raise
+                diff_info = DiffInfoPG2(delta=record.delta, data=record.data)
+                has_hunks = record.hunks != NO_HUNKS
+                diff_info._hunk_source = record.hunks if has_hunks else record.data
+                yield diff_info
+
+    def write_through(
+        self,
+        key: str,
+        diff_infos: Iterable[DiffInfoPG2],
+        store_hunks: bool = False,
+    ) -> Iterator[DiffInfoPG2]:
+        """
+        Pass the diff infos through while recording them. The entry is only committed
+        if the diff is consumed to the end (not if e.g. the file limit stops it early).
+        Each file is recorded once it has been handled, so its hunks are only stored if
+        the consumer decoded them, or if `store_hunks` (so that they are never parsed
+        back from the patch text, which gives different line content offsets). Each writer has its own temporary file, so concurrent
+        diffs of the same repo (in threads or processes) each commit a whole entry. If
+        the cache can't be written (e.g. a read-only home dir, or a full disk) the diff
+        infos are still passed through, just not recorded.
+        """
+        path = self.path(key)
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            cache_file = tempfile.NamedTemporaryFile(
+                dir=self.root, prefix=f"{key}.", suffix=".tmp", delete=False
+            )
+        except OSError:
+            yield from diff_infos
+            return
+        partial = Path(cache_file.name)
+        buf = bytearray()
+        recording = True
+        completed = False
+        try:
+            for diff_info in diff_infos:
+                yield diff_info
+                if not recording:
+                    continue
+                if store_hunks:
+                    decoded = diff_info.hunks
+                else:
+                    decoded = diff_info.__dict__.get("hunks")
+                if decoded is not None:
+                    hunks = list(map(StoredHunk.from_hunk, decoded))
+                else:
+                    hunks = None
+                record = CachedPatch(diff_info.delta, diff_info.data, hunks)
+                self.encoder.encode_into(record, buf, FRAME_HEADER)
+                buf[:FRAME_HEADER] = (len(buf) - FRAME_HEADER).to_bytes(
+                    FRAME_HEADER,
+                    "little",
+                )
+                try:
+                    cache_file.write(buf)
+                except OSError:
+                    recording = False  # e.g. the disk is full
+            completed = recording
+        finally:
+            try:
+                cache_file.close()
+            except OSError:
+                completed = False
+            with suppress(OSError):
+                if completed:
+                    os.replace(partial, path)  # The last of concurrent writers wins
+                    self.evict()
+                else:
+                    partial.unlink(missing_ok=True)
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache fits in its limit."""
+        entries = []
+        for entry in self.root.glob("*.msgpack"):
+            with suppress(FileNotFoundError):  # Evicted by a concurrent writer
+                entries.append((entry.stat(), entry))
+        total = sum(stat.st_size for stat, _ in entries)
+        for stat, entry in sorted(entries, key=lambda e: e[0].st_mtime):
+            if total <= self.limit:
+                break
+            entry.unlink(missing_ok=True)
+            total -= stat.st_size
+
+
+class MemoryDiffCache(DiffCache):
+    """
+    Hold converted diffs in memory under the same keys as `DiffCache`, for a process
+    that diffs the same repos repeatedly (i.e. the daemon). A change of the index or
+    the revision tree changes the key, so stale entries are simply never read again
+    and are evicted least recently used first once they exceed `limit` bytes.
+
+    Like the disk cache, each file is held as its delta, patch text and (only if they
+    were decoded) encoded hunks, not as the diff info itself: that would keep its
+    libgit2 patch (and through it the whole diff) alive, at many times the size of
+    the patch text. Each read builds fresh diff infos, so that hunks a consumer
+    decodes are not held either.
+    """
+
+    entries: OrderedDict[str, list[tuple[DiffDelta, bytes, bytes | None]]]
+    sizes: dict[str, int]
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.encoder = msgspec.msgpack.Encoder()
+
+    def read(self, key: str) -> Iterator[DiffInfoPG2] | None:
+        if (records := self.entries.get(key)) is None:
+            return None
+        self.entries.move_to_end(key)
+        return self._read_records(records)
+
+    def _read_records(
+        self,
+        records: list[tuple[DiffDelta, bytes, bytes | None]],
+    ) -> Iterator[DiffInfoPG2]:
+        for delta, data, hunks in records:
+            diff_info = DiffInfoPG2(delta=delta, data=data)
+            diff_info._hunk_source = data if hunks is None else Raw(hunks)
+            yield diff_info
+
+    def write_through(
+        self,
+        key: str,
+        diff_infos: Iterable[DiffInfoPG2],
+        store_hunks: bool = False,
+    ) -> Iterator[DiffInfoPG2]:
+        """
+        Pass the diff infos through, keeping them only if consumed to the end (and their
+        hunks as `DiffCache.write_through` does).
+        """
+        records = []
+        size = 0
+        for diff_info in diff_infos:
+            yield diff_info
+            if store_hunks:
+                decoded = diff_info.hunks
+            else:
+                decoded = diff_info.__dict__.get("hunks")
+            if decoded is not None:
+                hunks = self.encoder.encode(list(map(StoredHunk.from_hunk, decoded)))
+            else:
+                hunks = None
+            records.append((diff_info.delta, diff_info.data, hunks))
+            size += len(diff_info.data) + len(hunks or b"")
+        self.entries[key] = records
+        self.sizes[key] = size
+        self.evict()
+
+    def evict(self) -> None:
+        total = sum(self.sizes.values())
+        while total > self.limit and len(self.entries) > 1:
+            key, _ = self.entries.popitem(last=False)
+            total -= self.sizes.pop(key)
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from hashlib import blake2b
+from heapq import heappop, heappush, heapreplace
+
+from msgspec import Struct
+
+from .hunks import split_hunks
+from .pygit2 import DiffInfoPG2
+
+__all__ = ("HunkCluster", "HunkIndex", "hunk_digest")
+
+DIGEST_SIZE = 16
+MAX_SAMPLE_LINES = 20
+"""Lines of an occurrence kept to represent a distinct change."""
+MAX_SAMPLES = 1000
+"""Distinct changes (the most frequent so far) to keep a sample of: the rest are only
+counted, and not shown."""
+MAX_SAMPLE_PATHS = 5
+"""Paths listed per distinct change, beyond which only the file count is kept."""
+
+
+def hunk_digest(hunk: str) -> bytes:
+    """
+    Hash the added and removed lines of a hunk's text, ignoring its header, context
+    lines and whitespace, so the same change made in different places (or re-indented)
+    collides. Only this fixed-size digest is kept as the key, never the text.
+    """
+    digest = blake2b(digest_size=DIGEST_SIZE)
+    for line in hunk.splitlines()[1:]:
+        if line[:1] in ("+", "-"):
+            digest.update(line[0].encode())
+            digest.update(" ".join(line[1:].split()).encode())
+            digest.update(b"\n")
+    return digest.digest()
+
+
+def hunk_sample(hunk: str) -> str:
+    lines = hunk.splitlines(keepends=True)
+    sample = "".join(lines[: MAX_SAMPLE_LINES + 1])
+    if len(lines) > MAX_SAMPLE_LINES + 1:
+        sample += "...\n"
+    return sample
+
+
+class HunkCluster(Struct):
+    last_path: str
+    paths: list[str]
+    sample: str = ""
+    count: int = 1
+    file_count: int = 1
+
+    def add(self, path: str) -> None:
+        self.count += 1
+        if self.last_path != path:
+            self.last_path = path
+            self.file_count += 1
+            if len(self.paths) < MAX_SAMPLE_PATHS:
+                self.paths.append(path)
+
+
+class HunkIndex:
+    """
+    Group identical (up to whitespace) hunks across all files of a diff in one pass.
+    Each distinct change is keyed by a digest and keeps its counts and a few of its
+    paths, while a truncated sample is only kept for the `max_samples` most frequent so
+    far. Any occurrence serves as the sample, so a change gaining on them takes the
+    place of the least frequent when it next occurs, and the text held is bounded.
+    """
+
+    clusters: dict[bytes, HunkCluster]
+    hunk_count: int
+    max_samples: int
+
+    def __init__(self, max_samples: int = MAX_SAMPLES):
+        self.clusters = {}
+        self.hunk_count = 0
+        self.max_samples = max_samples
+        # The sampled changes' digests by their count when last checked (a lower bound)
+        self._sampled: list[tuple[int, bytes]] = []
+
+    def add(self, diff_info: DiffInfoPG2) -> None:
+        path = diff_info.delta.new_file.path
+        _, hunks = split_hunks(diff_info.text)
+        for hunk in hunks:
+            self.hunk_count += 1
+            key = hunk_digest(hunk)
+            if (cluster := self.clusters.get(key)) is not None:
+                cluster.add(path)
+            else:
+                cluster = self.clusters[key] = HunkCluster(last_path=path, paths=[path])
+            if not cluster.sample:
+                self.offer_sample(key, cluster, hunk)
+
+    def offer_sample(self, key: bytes, cluster: HunkCluster, hunk: str) -> None:
+        """Sample the hunk if its change is now among the most frequent sampled."""
+        sampled = self._sampled
+        if len(sampled) >= self.max_samples:
+            # Bring the least frequent entry's count up to date until it stays least
+            while (count := self.clusters[sampled[0][1]].count) != sampled[0][0]:
+                heapreplace(sampled, (count, sampled[0][1]))
+            if cluster.count <= count:
+                return
+            _, evicted = heappop(sampled)
+            self.clusters[evicted].sample = ""
+        heappush(sampled, (cluster.count, key))
+        cluster.sample = hunk_sample(hunk)
+
+    def add_all(self, diff_infos: Iterable[DiffInfoPG2]) -> HunkIndex:
+        for diff_info in diff_infos:
+            self.add(diff_info)
+        return self
+
+    def ranked(self) -> list[HunkCluster]:
+        """
+        The sampled distinct changes, most frequent first (ties kept in order of
+        appearance). A change was last offered the sample when it last occurred, and
+        the least frequent sample only ever gets replaced by a more frequent change, so
+        these are the `max_samples` most frequent changes.
+        """
+        sampled = (cluster for cluster in self.clusters.values() if cluster.sample)
+        return sorted(sampled, key=lambda c: c.count, reverse=True)
+
+    def unsampled(self) -> list[HunkCluster]:
+        """The rarer distinct changes that were only counted, and kept no sample."""
+        return [cluster for cluster in self.clusters.values() if not cluster.sample]
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import BinaryIO
+
+import msgspec
+
+from ...interfaces.diffing import OutputFormat
+from ..errors import FugitUserError
+from .pygit2 import DiffInfoPG2, DiffRecord
+
+__all__ = ("OutputFormat", "RecordWriter")
+
+FLUSH_SIZE = 1 << 20
+"""Bytes of encoded records to accumulate in the buffer before writing them out."""
+
+
+class RecordWriter:
+    """
+    Stream one `DiffRecord` per file as JSON Lines or concatenated msgpack objects. A
+    single encoder is reused and records are encoded straight onto the end of one
+    buffer, which is written out whenever it fills past `FLUSH_SIZE`.
+    """
+
+    stream: BinaryIO
+    buffer: bytearray
+
+    def __init__(self, output_format: OutputFormat, stream: BinaryIO):
+        match output_format:
+            case "jsonl":
+                self.encoder = msgspec.json.Encoder()
+                self.delimiter = b"\n"
+            case "msgpack":
+                self.encoder = msgspec.msgpack.Encoder()
+                self.delimiter = b""  # msgpack objects are self-delimiting
+            case _:
+                raise FugitUserError(
+                    f"Unknown output format {output_format!r} (expected jsonl or msgpack)",
+                    code="invalid-config",
+                )
+        self.stream = stream
+        self.buffer = bytearray()
+
+    def write(self, diff_info: DiffInfoPG2) -> None:
+        self.encoder.encode_into(DiffRecord.from_info(diff_info), self.buffer, -1)
+        self.buffer += self.delimiter
+        if len(self.buffer) >= FLUSH_SIZE:
+            self.flush()
+
+    def write_all(self, diff_infos: Iterable[DiffInfoPG2]) -> None:
+        for diff_info in diff_infos:
+            self.write(diff_info)
+        self.flush()
+
+    def flush(self) -> None:
+        self.stream.write(self.buffer)
+        self.stream.flush()
+        del self.buffer[:]
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import re
+from collections.abc import Iterable, Iterator
+from fnmatch import fnmatchcase
+
+from pygit2 import DiffDelta
+
+from ...interfaces import DiffConfig
+from ..text.scanning import compile_re
+from .hunks import split_hunks
+from .pygit2 import DeltaStatus, DiffInfoPG2
+
+__all__ = (
+    "discard_delta",
+    "match_pathspec",
+    "grep_alternation",
+    "grep_hunks",
+    "grep_diff_infos",
+    "select_hunks",
+)
+
+
+def discard_delta(delta: DiffDelta, config: DiffConfig) -> bool:
+    """
+    Filter file-level diffs using only the delta metadata (status and paths), which
+    libgit2 computes without generating any patch text.
+    """
+    if config.change_type:
+        change_type = DeltaStatus(delta.status).change_type
+        if change_type not in config.change_type:
+            return True
+    return False
+
+
+def match_pathspec(path: str, pathspec: list[str]) -> bool:
+    """
+    Match a path as libgit2 does by default: against an exact path, a leading directory
+    or a glob (in which `*` may also match "/"). Only needed where the diff itself could
+    not be given the pathspec (as for the tree-to-tree diffs of a commit range).
+    """
+    for spec in pathspec:
+        spec = spec.rstrip("/")
+        if path == spec or path.startswith(spec + "/") or fnmatchcase(path, spec):
+            return True
+    return False
+
+
+def grep_alternation(patterns: list[str]) -> str:
+    """Combine the patterns into one alternation, so each text is scanned only once."""
+    return "|".join(f"(?:{pattern})" for pattern in patterns)
+
+
+def matches_changed_line(hunk: str, pattern: re.Pattern) -> bool:
+    """Whether any match in the hunk falls on an added or removed line."""
+    for hit in pattern.finditer(hunk):
+        line_start = hunk.rfind("\n", 0, hit.start()) + 1
+        # Sliced, as a match at the very end of the hunk starts an empty "line"
+        if line_start and hunk[line_start : line_start + 1] in ("+", "-"):
+            return True
+    return False
+
+
+def select_hunks(text: str, pattern: re.Pattern) -> tuple[str, dict[int, str]] | None:
+    """
+    Find the hunks (by index) of a file's patch text whose added/removed lines match,
+    alongside the patch header, or give None if none do. Files with no match anywhere
+    are rejected after a single search, before being split into hunks.
+    """
+    if pattern.search(text) is None:
+        return None
+    header, hunks = split_hunks(text)
+    matched = {
+        index: hunk
+        for index, hunk in enumerate(hunks)
+        if matches_changed_line(hunk, pattern)
+    }
+    return (header, matched) if matched else None
+
+
+def grep_hunks(text: str, pattern: re.Pattern) -> str | None:
+    """Keep only the hunks of a file's patch text that match, or give None if none do."""
+    if (selected := select_hunks(text, pattern)) is None:
+        return None
+    header, matched = selected
+    return header + "".join(matched.values())
+
+
+def grep_diff_infos(
+    diff_infos: Iterable[DiffInfoPG2],
+    config: DiffConfig,
+) -> Iterator[DiffInfoPG2]:
+    """
+    Select files (and within them hunks) whose changed lines match any `config.grep`
+    pattern. The patch text is narrowed to the matching hunks, and so are the structured
+    hunks: those already decoded are filtered, otherwise they are once decoded.
+    """
+    if not config.grep:
+        yield from diff_infos
+        return
+    pattern = compile_re(grep_alternation(config.grep))
+    for diff_info in diff_infos:
+        # Escaped surrogates carry any invalid UTF-8 into the narrowed patch intact
+        text = diff_info.data.decode(errors="surrogateescape")
+        if (selected := select_hunks(text, pattern)) is None:
+            continue
+        header, matched = selected
+        if (narrowed_text := header + "".join(matched.values())) != text:
+            data = narrowed_text.encode(errors="surrogateescape")
+            narrowed = DiffInfoPG2(delta=diff_info.delta, data=data)
+            narrowed.__dict__.update(diff_info.__dict__)  # Carry over the hunk source
+            narrowed.__dict__.pop("text", None)  # But not the unnarrowed text
+            if (hunks := narrowed.__dict__.get("hunks")) is not None:
+                narrowed.hunks = [hunks[index] for index in matched]
+            else:
+                narrowed._hunk_indices = list(matched)
+            diff_info = narrowed
+        yield diff_info
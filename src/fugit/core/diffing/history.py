@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Iterator
+from functools import partial
+
+import msgspec
+from pygit2 import (
+    GIT_SORT_REVERSE,
+    GIT_SORT_TOPOLOGICAL,
+    Commit,
+    Oid,
+    Patch,
+    Repository,
+)
+from pygit2 import DiffDelta as GitDiffDelta
+
+from ...interfaces import DiffConfig
+from .cache import cache_dir
+from .filters import discard_delta, match_pathspec
+from .limits import FileGuard
+from .pygit2 import DiffInfoPG2
+from .pygit2.structures import DiffDelta
+from .similarity import SignatureCache, detects_similar, find_similar
+
+__all__ = ("BlobPairPatches", "iter_range_diff_infos", "patch_header")
+
+ZERO_OID = Oid(hex="0" * 40)
+
+
+def patch_header(delta: GitDiffDelta) -> str:
+    """Format the `git diff` file header for a delta, independently of its patch."""
+    old, new = delta.old_file, delta.new_file
+    lines = [f"diff --git a/{old.path} b/{new.path}\n"]
+    mode = ""
+    match delta.status_char():
+        case "A":
+            lines.append(f"new file mode {new.mode:o}\n")
+        case "D":
+            lines.append(f"deleted file mode {old.mode:o}\n")
+        case "R" | "C" as status:
+            verb = "rename" if status == "R" else "copy"
+            lines.append(f"similarity index {delta.similarity}%\n")
+            lines.append(f"{verb} from {old.path}\n{verb} to {new.path}\n")
+        case _ if old.mode != new.mode:
+            lines.append(f"old mode {old.mode:o}\nnew mode {new.mode:o}\n")
+        case _:
+            mode = f" {new.mode:o}"
+    if old.id != new.id:
+        lines.append(f"index {str(old.id)[:7]}..{str(new.id)[:7]}{mode}\n")
+        old_label = "/dev/null" if old.id == ZERO_OID else f"a/{old.path}"
+        new_label = "/dev/null" if new.id == ZERO_OID else f"b/{new.path}"
+        lines.append(f"--- {old_label}\n+++ {new_label}\n")
+    return "".join(lines)
+
+
+def patch_body(data: bytes) -> bytes:
+    """Strip the file header from a patch, leaving its hunks (or binary notice)."""
+    if body_start := data.find(b"\n@@") + 1:
+        return data[body_start:]
+    header = (b"diff --git ", b"index ", b"--- ", b"+++ ")
+    return b"".join(
+        line for line in data.splitlines(True) if not line.startswith(header)
+    )
+
+
+class BlobPairPatch:
+    """
+    The patch between a delta's blobs, as the source of its hunks. As only the patch
+    text is memoised, the patch is generated again from the blobs if the hunks of a
+    memoised pair are decoded.
+    """
+
+    __slots__ = ("repo", "delta", "blobs", "patch")
+
+    def __init__(self, repo: Repository, delta: GitDiffDelta):
+        self.repo = repo
+        self.delta = delta
+        self.blobs: tuple = ()
+        self.patch: Patch | None = None
+
+    def blob(self, oid: Oid):
+        return None if oid == ZERO_OID else self.repo[oid]
+
+    def create(self) -> Patch:
+        old, new = self.delta.old_file, self.delta.new_file
+        # The patch points into the blobs' buffers, so they are held as long as it is
+        self.blobs = self.blob(old.id), self.blob(new.id)
+        self.patch = Patch.create_from(
+            *self.blobs, old_as_path=old.path, new_as_path=new.path
+        )
+        return self.patch
+
+    @property
+    def hunks(self) -> list:
+        return (self.patch or self.create()).hunks
+
+
+class BlobPairPatches:
+    """
+    Memoise patch generation per (old blob OID, new blob OID) pair, so that the same
+    blob transition recurring across commits (reverts, cherry-picks, re-applied
+    formatter changes) is only diffed once. Only the hunk body is shared between
+    deltas: the file header is formatted per delta as the paths may differ. The memo
+    holds at most `maxbytes` of hunk bodies, evicting the least recently used.
+    """
+
+    repo: Repository
+    maxbytes: int
+    size: int
+    hits: int
+    misses: int
+
+    def __init__(self, repo: Repository, maxbytes: int = 64 * 2**20):
+        self.repo = repo
+        self.maxbytes = maxbytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._memo: OrderedDict[tuple[Oid, Oid], bytes] = OrderedDict()
+
+    def get(self, delta: GitDiffDelta) -> tuple[bytes, BlobPairPatch]:
+        key = (delta.old_file.id, delta.new_file.id)
+        source = BlobPairPatch(self.repo, delta)
+        if (body := self._memo.get(key)) is not None:
+            self.hits += 1
+            self._memo.move_to_end(key)
+            return body, source
+        self.misses += 1
+        body = self._memo[key] = patch_body(source.create().data)
+        self.size += len(body)
+        while self.size > self.maxbytes:
+            _, evicted = self._memo.popitem(last=False)
+            self.size -= len(evicted)
+        return body, source
+
+    def diff_info(self, delta: GitDiffDelta) -> DiffInfoPG2:
+        body, source = self.get(delta)
+        diff_info = DiffInfoPG2(
+            delta=msgspec.convert(delta, DiffDelta, from_attributes=True),
+            data=patch_header(delta).encode() + body,
+        )
+        diff_info._hunk_source = source
+        return diff_info
+
+
+def matches_delta(delta: GitDiffDelta, pathspec: list[str]) -> bool:
+    """A rename or copy is kept if either its old or new path matches."""
+    paths = {delta.old_file.path, delta.new_file.path}
+    return any(match_pathspec(path, pathspec) for path in paths)
+
+
+def guarded_diff_info(
+    patches: BlobPairPatches, guard: FileGuard, delta: GitDiffDelta
+) -> DiffInfoPG2:
+    """The delta's summary if the guard stops it, else its patch from the memo."""
+    if (skipped := guard.check(delta)) is not None:
+        return skipped.diff_info()
+    return patches.diff_info(delta)
+
+
+def iter_range_diff_infos(
+    repo: Repository,
+    config: DiffConfig,
+) -> Iterator[tuple[Commit, Iterator[DiffInfoPG2]]]:
+    """
+    Walk the commits in `config.range` (e.g. "A..B", oldest first) and give each one's
+    diff against its first parent, as `git log -p` does (so merges are skipped). Only
+    the cheap tree-to-tree delta lists are computed per commit; patches come from the
+    shared blob pair memo.
+    """
+    spec = repo.revparse(config.range)
+    if spec.to_object is None:
+        # A single revision (no "..") means its entire history
+        tip, base = spec.from_object, None
+    else:
+        tip, base = spec.to_object, spec.from_object
+    walker = repo.walk(tip.id, GIT_SORT_TOPOLOGICAL | GIT_SORT_REVERSE)
+    if base is not None:
+        walker.hide(base.id)
+    patches = BlobPairPatches(repo)
+    guard = FileGuard.from_config(repo, config)
+    signatures = None
+    if detects_similar(config):
+        root = None if config.skip_cache else cache_dir() / "signatures"
+        signatures = SignatureCache(repo, root)
+    try:
+        for commit in walker:
+            if len(commit.parents) > 1:
+                continue
+            if commit.parents:
+                tree_diff = commit.parents[0].tree.diff_to_tree(
+                    commit.tree, interhunk_lines=0
+                )
+            else:
+                tree_diff = commit.tree.diff_to_tree(swap=True, interhunk_lines=0)
+            deltas = tree_diff.deltas
+            if signatures is not None:
+                deltas = (d for _, d in find_similar(deltas, config, signatures, guard))
+            deltas = (d for d in deltas if not discard_delta(d, config))
+            if config.pathspec:
+                deltas = (d for d in deltas if matches_delta(d, config.pathspec))
+            if guard is not None:
+                yield commit, map(partial(guarded_diff_info, patches, guard), deltas)
+            else:
+                yield commit, map(patches.diff_info, deltas)
+    finally:
+        if signatures is not None:
+            signatures.save()
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+__all__ = ("count_hunks", "split_hunks")
+
+
+def split_hunks(text: str) -> tuple[str, list[str]]:
+    """
+    Split a file's patch text into its header and the text of each hunk (starting at
+    its "@@" line), without decoding any hunk or line structs. Lines inside a hunk all
+    begin with an origin character, so only hunk headers follow a newline with "@@".
+    """
+    starts = [0] if text.startswith("@@") else []
+    pos = text.find("\n@@")
+    while pos != -1:
+        starts.append(pos + 1)
+        pos = text.find("\n@@", pos + 1)
+    if not starts:
+        return text, []
+    bounds = [*starts, len(text)]
+    hunks = [text[start:stop] for start, stop in zip(bounds, bounds[1:])]
+    return text[: starts[0]], hunks
+
+
+def count_hunks(data: bytes) -> int:
+    """Count the hunks in a file's patch by their "@@" lines."""
+    return data.count(b"\n@@") + data.startswith(b"@@")
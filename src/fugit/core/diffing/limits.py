@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import msgspec
+from pygit2 import GIT_DIFF_FLAG_BINARY, Oid, Repository
+from pygit2 import DiffDelta as GitDiffDelta
+from pygit2 import DiffFile as GitDiffFile
+
+from ...interfaces import DiffConfig
+from .pygit2 import DiffInfoPG2
+from .pygit2.structures import DiffDelta
+
+__all__ = ("FileGuard", "SkippedFile", "blob_size")
+
+BINARY_SNIFF = 8000
+"""As git does, a blob with a NUL byte in this many leading bytes is binary."""
+GIT_DIFF_FLAG_VALID_SIZE = 1 << 4
+"""The libgit2 file flag for a known size, which pygit2 1.13 doesn't export."""
+
+
+def blob_size(backends: list, oid: Oid) -> int:
+    """
+    Read a blob's size from its object header, without loading it, from the first of
+    the ODB `backends` that has it (`Odb.read_header` is only in newer pygit2). The
+    zero OID of an added or deleted file's other side has size 0.
+    """
+    for backend in backends:
+        try:
+            _, size = backend.read_header(oid)
+        except KeyError:
+            continue
+        return size
+    return 0
+
+
+class SkippedFile:
+    """
+    A file whose patch is not generated, as it is binary or over the size limits, so it
+    is output as a one-line summary of its sizes and blob OIDs instead.
+    """
+
+    __slots__ = ("delta", "binary", "sizes")
+
+    def __init__(self, delta: GitDiffDelta, binary: bool, sizes: tuple[int, int]):
+        self.delta = delta
+        self.binary = binary
+        self.sizes = sizes
+
+    @property
+    def text(self) -> str:
+        kind = "Binary" if self.binary else "Large"
+        old, new = (str(f.id)[:7] for f in (self.delta.old_file, self.delta.new_file))
+        old_size, new_size = self.sizes
+        return (
+            f"{kind} file not diffed: {old_size} -> {new_size} bytes,"
+            f" index {old}..{new}\n"
+        )
+
+    def diff_info(self) -> DiffInfoPG2:
+        """The summary in place of the patch text, and (as there is no patch) no hunks."""
+        return DiffInfoPG2(
+            delta=msgspec.convert(self.delta, DiffDelta, from_attributes=True),
+            data=self.text.encode(),
+        )
+
+
+class FileGuard:
+    """
+    Decide from a delta alone, before libgit2 is asked for its patch, whether either
+    blob is over `max_bytes` (read from the object header, without loading it) or
+    `max_lines`, or is binary. Line counts need the blob, so are only checked for blobs
+    within the byte limit (and bigger than the line limit), so setting both bounds the
+    work any one file can cause. Blobs loaded to count lines are checked for binary
+    content too, otherwise only binaries libgit2 already knows of are summarised.
+    """
+
+    repo: Repository
+    max_bytes: int
+    max_lines: int
+    backends: list
+
+    def __init__(self, repo: Repository, max_bytes: int = 0, max_lines: int = 0):
+        self.repo = repo
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.backends = list(repo.odb.backends)
+
+    @classmethod
+    def from_config(cls, repo: Repository, config: DiffConfig) -> FileGuard | None:
+        """A guard for the config's limits, or None if it sets none."""
+        if not (config.large_file_bytes or config.large_file_lines):
+            return None
+        return cls(repo, config.large_file_bytes, config.large_file_lines)
+
+    def size(self, diff_file: GitDiffFile) -> int:
+        if diff_file.flags & GIT_DIFF_FLAG_VALID_SIZE:
+            return diff_file.size
+        return blob_size(self.backends, diff_file.id)
+
+    def skips(self, diff_file: GitDiffFile) -> bool:
+        """
+        Whether a blob is over `max_bytes` or already known to be binary, found without
+        loading it, so that rename detection can leave it out rather than load and hash
+        a blob that would only be summarised.
+        """
+        if diff_file.flags & GIT_DIFF_FLAG_BINARY:
+            return True
+        return bool(self.max_bytes) and self.size(diff_file) > self.max_bytes
+
+    def check(self, delta: GitDiffDelta) -> SkippedFile | None:
+        files = delta.old_file, delta.new_file
+        sizes = self.size(files[0]), self.size(files[1])
+        # Not the delta's `flags` or `is_binary`, which pygit2 answers by making the
+        # patch if libgit2 hasn't yet looked at the content: only the files' flags are
+        # read, which are set if already known (e.g. from `.gitattributes`)
+        if (files[0].flags | files[1].flags) & GIT_DIFF_FLAG_BINARY:
+            return SkippedFile(delta, binary=True, sizes=sizes)
+        if self.max_bytes and max(sizes) > self.max_bytes:
+            return SkippedFile(delta, binary=False, sizes=sizes)
+        if self.max_lines:
+            for diff_file, size in zip(files, sizes):
+                if size <= self.max_lines:
+                    continue  # Can't have more line breaks than bytes
+                data = self.repo[diff_file.id].data
+                if b"\0" in data[:BINARY_SNIFF]:
+                    return SkippedFile(delta, binary=True, sizes=sizes)
+                if data.count(b"\n") > self.max_lines:
+                    return SkippedFile(delta, binary=False, sizes=sizes)
+        return None
@@ -1,31 +1,82 @@
 from __future__ import annotations
 
+import sys
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from itertools import chain, islice
+
 import msgspec
 
 # from git import Repo
 # from pydantic import ValidationError
-from pygit2 import Repository
+from pygit2 import Diff, Patch, Repository
+from pygit2 import DiffDelta as GitDiffDelta
 
-from ...interfaces import DiffConfig
-from ..io import FugitConsole, fugit_console
-from ..text.bases import Span, SpannedText, Style
-from ..text.palette import BLUE, BOLD, BOLD_YELLOW_US, GREEN, RED, RESET, WHITE
-from ..text.scanning import compile_re
+from ...interfaces import DiffConfig, profiling_requested
+from .. import io, profiling
 
 # from .gitpython import DiffInfoGP, count_match, get_diff
-from .pygit2 import DiffInfoPG2
+from ..error_handlers import SuppressBrokenPipeError
+from ..io import FugitConsole
+from .cache import DiffCache, cache_dir
+from .clustering import HunkIndex
+from .encoding import RecordWriter
+from .filters import discard_delta, grep_alternation, grep_diff_infos
+from .history import BlobPairPatches, iter_range_diff_infos
+from .hunks import count_hunks
+from .limits import FileGuard, SkippedFile
+from .parallel import render_parallel
+from .pygit2 import DiffInfoPG2, diff_tree_to_index
+from .rendering import (
+    highlight_diff,
+    render_cluster,
+    render_commit,
+    render_diff,
+    render_unsampled,
+)
+from .similarity import SignatureCache, SimilarDelta, detects_similar, find_similar
+from .stats import iter_file_stats, iter_text_stats, render_numstat, render_stat
 
 # from line_profiler import profile
 
 
-__all__ = ("diff", "load_diff", "highlight_diff", "process_diff")
+__all__ = (
+    "diff",
+    "load_diff",
+    "iter_diff",
+    "structured_diff_infos",
+    "range_diff_infos",
+    "discard_delta",
+    "iter_patches",
+    "iter_diff_infos",
+    "similar_deltas",
+    "iter_similar_patches",
+    "iter_similar_diff_infos",
+    "diff_to_index",
+    "cache_key",
+    "recover_cached",
+    "load_diff_infos",
+    "limit_files",
+    "process_range",
+    "write_records",
+    "process_stats",
+    "process_clusters",
+    "highlight_diff",
+    "process_diff",
+    "submit_rendered",
+    "tally_diff_infos",
+    "counted_diff_infos",
+)
 
 STORE_DIFFS = False
 DiffInfoGP = None  # Not migrated
 
 
 def diff(**config) -> list[str]:
-    """Narrow the input type to DiffConfig type for `load_diff`."""
+    """
+    Narrow the input type to DiffConfig type for `load_diff`, which prints the diff. To
+    get the diffs themselves, iterate over `iter_diff` instead.
+    """
     return load_diff(msgspec.convert(config, type=DiffConfig))
 
 
@@ -34,7 +85,53 @@ def load_diff(config: DiffConfig) -> list[str]:
     # return load_diff_gitpython(config)
     """Try to get pygit2 cached diffs to work"""
     # FIXME Decommission GitPython until it is migrated to msgspec
-    return load_diff_pygit2(config)  # if config.pygit2 else load_diff_gitpython(config)
+    if not profiling_requested(config):
+        # if config.pygit2 else load_diff_gitpython(config)
+        return load_diff_pygit2(config)
+    profiler = profiling.profiler = profiling.Profiler(
+        enabled=True,
+        trace_memory=config.profile_memory,
+    )
+    profiler.start()
+    try:
+        return load_diff_pygit2(config)
+    finally:
+        profiling.profiler = profiling.Profiler()
+        profiler.stop().write(config.profile_json)
+
+
+def iter_diff(config: DiffConfig) -> Iterator[DiffInfoPG2]:
+    """
+    Generate the structured diff of each file the CLI would render for `config`, without
+    touching the console or pager. Files are diffed, converted and filtered one at a
+    time as they are consumed, so only one file's diff is held in memory at once (or,
+    for a negative `file_limit`, as many as are kept from the end).
+    """
+    repo = Repository(config.repo)
+    yield from limit_files(structured_diff_infos(repo, config), config.file_limit)
+
+
+def structured_diff_infos(
+    repo: Repository,
+    config: DiffConfig,
+    cache: DiffCache | None = None,
+) -> Iterator[DiffInfoPG2]:
+    """
+    The diff infos of each commit in `config.range` in turn (oldest first), else of the
+    index, for consumers of their hunks (`iter_diff` and the record output formats).
+    """
+    if config.range:
+        return range_diff_infos(repo, config)
+    return load_diff_infos(repo, config, cache, hunks=True)
+
+
+def range_diff_infos(repo: Repository, config: DiffConfig) -> Iterator[DiffInfoPG2]:
+    """The diff infos of every commit in `config.range`, oldest first, without commits."""
+    commit_diffs = iter_range_diff_infos(repo, config)
+    diff_infos = chain.from_iterable(infos for _, infos in commit_diffs)
+    if config.grep:
+        diff_infos = grep_diff_infos(diff_infos, config)
+    return tally_diff_infos(diff_infos)
 
 
 # @profile
@@ -46,100 +143,397 @@ def process_diff(
 ) -> None:
     if config.change_type and (diff_info.change_type not in config.change_type):
         return
-    filtrated = diff_info.text
     if STORE_DIFFS:
-        diffs.append(filtrated)
-    if config.plain:
-        header = (diff_info.overview,)
-    else:
-        header = (BOLD_YELLOW_US, diff_info.overview, RESET)
-    # This simulates the render process (`Console.render_str`)
-    highlightable_lines = filtrated.splitlines(keepends=True)
-    diff_line_count, highlighted_lines = highlight_diff(
-        highlightable_lines,
-        plain=config.plain,
-    )
-    console.submit(*header, *highlighted_lines)
+        diffs.append(diff_info.text)
+    with profiling.profiler.phase("highlight"):
+        line_count, rendered = render_diff(
+            diff_info.overview,
+            diff_info.data,
+            plain=config.plain,
+            grep=grep_alternation(config.grep),
+            words=config.word_diff,
+        )
+    with profiling.profiler.phase("render"):
+        submit_rendered(console, line_count, rendered)
+    return
+
+
+def submit_rendered(console: FugitConsole, line_count: int, *rendered: bytes) -> None:
+    """Count the lines of a file's rendered output and submit it to the console."""
+    console.line_count += line_count
+    console.submit(*rendered)
     console.file_count += 1
-    console.line_count += diff_line_count + 1
+    profiling.profiler.count(lines=line_count)
     return
 
 
-highlight_patterns = {
-    "hunk_context": (r"^@@.*", Style.W),  # applied first (whole line)
-    "hunk_header": (r"^@@.*?@@ ", Style.b),  # applied second (only inside @ signs)
-}
+def iter_patches(
+    repo_diff: Diff,
+    config: DiffConfig | None = None,
+    guard: FileGuard | None = None,
+) -> Iterator[Patch | SkippedFile]:
+    """
+    Generate one patch at a time, so that only a single file's patch is ever held in
+    memory rather than the whole diff. The cheap delta list is walked first, and
+    libgit2 is only asked to build the patch for deltas that pass the `config` filters
+    (and the `guard`'s size limits, else they are given as a `SkippedFile`).
+    """
+    for idx, delta in enumerate(repo_diff.deltas):
+        if config is not None and discard_delta(delta, config):
+            continue
+        if guard is not None and (skipped := guard.check(delta)) is not None:
+            yield skipped
+            continue
+        patch = repo_diff[idx]
+        if patch is None:
+            continue
+        yield patch
 
 
-def highlight_regex(line: SpannedText, style_patterns: list[tuple[str, str]]) -> None:
-    for pattern, style in style_patterns:
-        for hit in compile_re(pattern).finditer(line.line):
-            start, stop = hit.span()
-            span = Span(start=start, stop=stop, style=style)
-            line.spans.append(span)
-    return
+def iter_diff_infos(
+    repo_diff: Diff,
+    config: DiffConfig | None = None,
+    guard: FileGuard | None = None,
+) -> Iterator[DiffInfoPG2]:
+    """Convert each patch from `iter_patches` as it is generated."""
+    converting = profiling.profiler.phase("convert")
+    patches = iter_patches(repo_diff, config, guard)
+    for patch in profiling.profiler.iterate("diff", patches):
+        with converting:
+            if isinstance(patch, SkippedFile):
+                diff_info = patch.diff_info()
+            else:
+                diff_info = DiffInfoPG2.from_patch(patch)
+        yield diff_info
 
 
-# @profile
-def highlight_diff(
-    source_lines: list[str],
-    plain: bool = False,
-) -> tuple[int, list[str]]:
-    """This replaces the highlighter applied by `Console.render_markup`."""
-    diff_line_texts = []
-    diff_line_count = 0
-
-    def store(texts: list[str]) -> None:
-        nonlocal diff_line_count
-        diff_line_texts.extend(texts)
-        diff_line_count += 1
-
-    for line in source_lines:
-        match line[0]:
-            case "d" | "i":
-                continue  # diff or index
-            case "+":
-                if line[1] == "+":
-                    continue
-                store([line] if plain else [GREEN, line, RESET])
-                continue
-            case "-":
-                if line[1] == "-":
-                    continue
-                store([line] if plain else [RED, line, RESET])
-                continue
-            case " ":
-                store([line] if plain else [WHITE, line, RESET])
-                continue
-            case "@":
-                # highlight_regex(diff_line, list(highlight_patterns.values()))
-                hed_cutoff = line[2:].find("@@") + 4
-                hed_span = line[:hed_cutoff]
-                rest_span = line[hed_cutoff:]
-                store([line] if plain else [BOLD, BLUE, hed_span, RESET, rest_span])
+def similar_deltas(
+    repo: Repository,
+    repo_diff: Diff,
+    config: DiffConfig,
+    guard: FileGuard | None = None,
+) -> list[tuple[int, GitDiffDelta | SimilarDelta]]:
+    """
+    Find renames and copies among the diff's deltas (among the blobs the `guard` would
+    not summarise), then apply the `config` filters.
+    """
+    root = None if config.skip_cache else cache_dir() / "signatures"
+    signatures = SignatureCache(repo, root)
+    with profiling.profiler.phase("similarity"):
+        deltas = find_similar(repo_diff.deltas, config, signatures, guard)
+        signatures.save()
+    return [(idx, delta) for idx, delta in deltas if not discard_delta(delta, config)]
+
+
+def iter_similar_patches(
+    repo: Repository,
+    repo_diff: Diff,
+    config: DiffConfig,
+    guard: FileGuard | None = None,
+) -> Iterator[Patch | SkippedFile]:
+    """Like `iter_patches`, with each rename or copy patched from its pair of blobs."""
+    for idx, delta in similar_deltas(repo, repo_diff, config, guard):
+        if guard is not None and (skipped := guard.check(delta)) is not None:
+            yield skipped
+        elif isinstance(delta, SimilarDelta):
+            old, new = delta.old_file, delta.new_file
+            # The patch points into the blobs' buffers, so they must outlive it
+            blobs = repo[old.id], repo[new.id]
+            yield Patch.create_from(*blobs, old_as_path=old.path, new_as_path=new.path)
+        elif (patch := repo_diff[idx]) is not None:
+            yield patch
+
+
+def iter_similar_diff_infos(
+    repo: Repository,
+    repo_diff: Diff,
+    config: DiffConfig,
+    guard: FileGuard | None = None,
+) -> Iterator[DiffInfoPG2]:
+    """
+    Like `iter_diff_infos`, but with renames and copies found by `find_similar` in place
+    of their additions and deletions. Their patch text (with its rename or copy header)
+    is made from the blob pair, the rest are converted from the diff as usual.
+    """
+    patches = BlobPairPatches(repo)
+    converting = profiling.profiler.phase("convert")
+    for idx, delta in similar_deltas(repo, repo_diff, config, guard):
+        with converting:
+            if guard is not None and (skipped := guard.check(delta)) is not None:
+                diff_info = skipped.diff_info()
+            elif isinstance(delta, SimilarDelta):
+                diff_info = patches.diff_info(delta)
+            elif (patch := repo_diff[idx]) is not None:
+                diff_info = DiffInfoPG2.from_patch(patch)
+            else:
                 continue
-            case _:
-                store([line])
-    return diff_line_count, diff_line_texts
+        yield diff_info
+
+
+def diff_to_index(repo: Repository, config: DiffConfig) -> Iterator[DiffInfoPG2]:
+    """Diff the revision against the index and convert each file's patch in turn."""
+    with profiling.profiler.phase("diff"):
+        repo_diff = diff_tree_to_index(repo, config.revision, config.pathspec)
+    guard = FileGuard.from_config(repo, config)
+    if detects_similar(config):
+        return iter_similar_diff_infos(repo, repo_diff, config, guard)
+    return iter_diff_infos(repo_diff, config=config, guard=guard)
+
+
+def tally_diff_infos(diff_infos: Iterator[DiffInfoPG2]) -> Iterator[DiffInfoPG2]:
+    """Count the files, hunks and bytes of patch text passing through, when profiling."""
+    if not profiling.profiler.enabled:
+        return diff_infos
+    return counted_diff_infos(diff_infos, profiling.profiler)
+
+
+def counted_diff_infos(
+    diff_infos: Iterator[DiffInfoPG2],
+    profiler: profiling.Profiler,
+) -> Iterator[DiffInfoPG2]:
+    for info in diff_infos:
+        profiler.count(files=1, hunks=count_hunks(info.data), bytes=len(info.data))
+        yield info
+
+
+def cache_key(
+    cache: DiffCache,
+    repo: Repository,
+    config: DiffConfig,
+    hunks: bool = False,
+) -> str:
+    """
+    The cache key of the `config`'s diff. Entries which store every file's hunks (for
+    consumers of the `hunks`) are kept apart from those of text output, which has none.
+    """
+    renames = config.rename_threshold, config.rename_copy_threshold, config.rename_limit
+    return cache.key(
+        repo,
+        config.revision,
+        change_type=config.change_type,
+        pathspec=config.pathspec,
+        conversion=(
+            *(renames if detects_similar(config) else (0, 0, 0)),
+            config.large_file_bytes,
+            config.large_file_lines,
+            int(hunks),
+        ),
+    )
+
+
+def recover_cached(
+    cached: Iterator[DiffInfoPG2],
+    rediff: Callable[[], Iterator[DiffInfoPG2]],
+) -> Iterator[DiffInfoPG2]:
+    """
+    Pass on the diff infos read from a cache entry, unless it turns out to be corrupt
+    (or can't be read) partway through, in which case the rest are taken from a fresh
+    diff, skipping those already given.
+    """
+    given = 0
+    try:
+        for diff_info in cached:
+            yield diff_info
+            given += 1
+    except (OSError, msgspec.DecodeError):
+        yield from islice(rediff(), given, None)
+
+
+def load_diff_infos(
+    repo: Repository,
+    config: DiffConfig,
+    cache: DiffCache | None = None,
+    hunks: bool = False,
+) -> Iterator[DiffInfoPG2]:
+    """
+    Diff the revision against the index, reading from the cache (on disk unless another
+    is given) when the same revision tree and index have been diffed before (unless
+    disabled by `skip_cache`). Any problem with the cache just means a fresh diff.
+
+    Consumers of the `hunks` (structured output) read and write separate entries which
+    store every file's hunks as libgit2 gave them, so that they are the same whether or
+    not the diff was cached. Text output's entries hold no hunks.
+    """
+    profiler = profiling.profiler
+    if config.skip_cache:
+        diff_infos = diff_to_index(repo, config)
+    else:
+        if cache is None:
+            cache = DiffCache(cache_dir(), limit=config.max_cache_size * 2**20)
+        with profiler.phase("cache"):
+            key = cache_key(cache, repo, config, hunks)
+            diff_infos = cache.read(key)
+        if diff_infos is None:
+            diff_infos = diff_to_index(repo, config)
+            diff_infos = cache.write_through(key, diff_infos, store_hunks=hunks)
+        else:
+            diff_infos = recover_cached(diff_infos, lambda: diff_to_index(repo, config))
+        diff_infos = profiler.iterate("cache", diff_infos)
+    if config.grep:
+        diff_infos = profiler.iterate("filter", grep_diff_infos(diff_infos, config))
+    return tally_diff_infos(diff_infos)
+
+
+def process_range(
+    console: FugitConsole,
+    repo: Repository,
+    diffs: list[str],
+    config: DiffConfig,
+) -> list[str]:
+    """Render each commit in `config.range` followed by its diffs, oldest first."""
+    profiler = profiling.profiler
+    for commit, diff_infos in iter_range_diff_infos(repo, config):
+        diff_infos = profiler.iterate("diff", diff_infos)
+        if config.grep:
+            diff_infos = grep_diff_infos(diff_infos, config)
+            diff_infos = profiler.iterate("filter", diff_infos)
+        diff_infos = tally_diff_infos(diff_infos)
+        header = render_commit(
+            str(commit.id), commit.message.partition("\n")[0], config.plain
+        )
+        console.line_count += 1
+        console.submit_header(header.encode())
+        for diff_info in diff_infos:
+            process_diff(
+                console=console, diff_info=diff_info, diffs=diffs, config=config
+            )
+    return diffs
+
+
+def limit_files(diff_infos: Iterable[DiffInfoPG2], file_limit: int) -> Iterable:
+    """Keep only the first `file_limit` files, or the last if it is negative."""
+    if file_limit > 0:
+        return islice(diff_infos, file_limit)
+    elif file_limit < 0:
+        return deque(diff_infos, maxlen=-file_limit)
+    return diff_infos
+
+
+def write_records(diff_infos: Iterator[DiffInfoPG2], config: DiffConfig) -> None:
+    """Stream machine-readable records to stdout, bypassing the console and pager."""
+    writer = RecordWriter(config.output_format, sys.stdout.buffer)
+    if config.quiet:
+        return
+    diff_infos = limit_files(diff_infos, config.file_limit)
+    with SuppressBrokenPipeError(), profiling.profiler.phase("render"):
+        writer.write_all(diff_infos)
+
+
+def process_stats(console: FugitConsole, repo: Repository, config: DiffConfig) -> None:
+    """
+    Summarise per-file added/deleted line counts as `git diff --stat` or `--numstat`
+    would, from libgit2's line stats alone (no patch text is rendered). With `--grep`
+    only the matching hunks count, so their lines are counted from the narrowed text.
+    """
+    profiler = profiling.profiler
+    if config.grep:
+        file_stats = iter_text_stats(load_diff_infos(repo, config))
+    else:
+        with profiler.phase("diff"):
+            repo_diff = diff_tree_to_index(repo, config.revision, config.pathspec)
+        guard = FileGuard.from_config(repo, config)
+        if detects_similar(config):
+            patches = iter_similar_patches(repo, repo_diff, config, guard)
+        else:
+            patches = iter_patches(repo_diff, config=config, guard=guard)
+        file_stats = iter_file_stats(profiler.iterate("diff", patches))
+    if config.output_format == "numstat":
+        for file_stat in file_stats:
+            with profiler.phase("render"):
+                submit_rendered(console, 1, render_numstat(file_stat).encode())
+        return
+    file_stats = list(file_stats)
+    with profiler.phase("render"):
+        stat_lines = render_stat(file_stats, console.size().width, plain=config.plain)
+        for line in stat_lines:
+            submit_rendered(console, 1, line.encode())
+    return
+
+
+def process_clusters(
+    console: FugitConsole,
+    diff_infos: Iterator[DiffInfoPG2],
+    config: DiffConfig,
+) -> None:
+    """
+    Print each distinct change once, most frequent first, with where it occurs. Only
+    those the index kept a sample of are shown, followed by a count of the rest.
+    """
+    with profiling.profiler.phase("cluster"):
+        index = HunkIndex().add_all(diff_infos)
+    for cluster in index.ranked():
+        with profiling.profiler.phase("highlight"):
+            line_count, rendered = render_cluster(
+                cluster.count,
+                cluster.file_count,
+                cluster.paths,
+                cluster.sample,
+                plain=config.plain,
+                words=config.word_diff,
+            )
+        with profiling.profiler.phase("render"):
+            submit_rendered(console, line_count, rendered)
+    if unsampled := index.unsampled():
+        hunk_count = sum(cluster.count for cluster in unsampled)
+        note = render_unsampled(len(unsampled), hunk_count, plain=config.plain)
+        with profiling.profiler.phase("render"):
+            submit_rendered(console, 1, note.encode())
+    return
 
 
 # @profile
-def load_diff_pygit2(config: DiffConfig) -> list[str]:
+def load_diff_pygit2(
+    config: DiffConfig,
+    repo: Repository | None = None,
+    cache: DiffCache | None = None,
+) -> list[str]:
     """
     Note: You can either implement commit tree-based diffs (with no 'R' kwarg reversal
     weirdness) or get it from a string at runtime (more configurable so we do that).
+
+    A long-lived caller (i.e. the daemon) can pass an already open `repo` and a `cache`
+    to use in place of the on-disk one.
     """
-    repo = Repository(config.repo)
-    tree = config.revision
-    repo_diff_patch = repo.diff(tree, cached=True)
+    if repo is None:
+        with profiling.profiler.phase("open repo"):
+            repo = Repository(config.repo)
     diffs: list[str] = []
-    with fugit_console.pager() as console:
-        validated_diffs = msgspec.convert(
-            list(repo_diff_patch),
-            list[DiffInfoPG2],
-            from_attributes=True,
-        )
-        for diff_info in filter(None, validated_diffs):
+    if config.output_format in ("stat", "numstat"):
+        with io.fugit_console.pager() as console:
+            process_stats(console, repo, config)
+        return diffs
+    if config.output_format == "cluster":
+        with io.fugit_console.pager() as console:
+            if config.range:
+                diff_infos = range_diff_infos(repo, config)
+            else:
+                diff_infos = load_diff_infos(repo, config, cache)
+            process_clusters(console, diff_infos, config)
+        return diffs
+    if config.output_format != "text":
+        write_records(structured_diff_infos(repo, config, cache), config)
+        return diffs
+    with io.fugit_console.pager() as console:
+        if config.range:
+            return process_range(console, repo, diffs, config)
+        diff_infos = load_diff_infos(repo, config, cache)
+        if config.jobs > 1:
+            rendered_diffs = render_parallel(
+                diff_infos,
+                config.jobs,
+                plain=config.plain,
+                grep=grep_alternation(config.grep),
+                words=config.word_diff,
+            )
+            # Waiting on the worker processes counts as highlighting
+            rendered_diffs = profiling.profiler.iterate("highlight", rendered_diffs)
+            for diff_info, line_count, rendered in rendered_diffs:
+                if STORE_DIFFS:
+                    diffs.append(diff_info.text)
+                with profiling.profiler.phase("render"):
+                    submit_rendered(console, line_count, rendered)
+            return diffs
+        for diff_info in diff_infos:
             process_diff(
                 console=console,
                 diff_info=diff_info,
@@ -165,7 +559,7 @@ def load_diff_pygit2(config: DiffConfig) -> list[str]:
 #     file_diff_info = get_diff(index, tree, create_patch=False)
 #     count_match(file_diff_patch, file_diff_info)
 #     diffs: list[str] = []
-#     with fugit_console.pager() as console:
+#     with io.fugit_console.pager() as console:
 #         for patch, info in zip(file_diff_patch, file_diff_info):
 #             try:
 #                 diff_info = DiffInfoGP.from_tree_pair(patch=patch, info=info)
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future
+from functools import partial
+from itertools import islice
+
+from .pygit2 import DiffInfoPG2
+from .rendering import render_chunk
+
+__all__ = ("render_parallel",)
+
+CHUNK_SIZE = 64
+"""Files per task sent to a worker, to amortise the IPC cost over many small patches."""
+
+
+def render_parallel(
+    diff_infos: Iterable[DiffInfoPG2],
+    jobs: int,
+    plain: bool = False,
+    grep: str = "",
+    words: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[tuple[DiffInfoPG2, int, bytes]]:
+    """
+    Render file patches in `jobs` worker processes, yielding each file's info alongside
+    its line count and rendered output in the original delta order. At most two chunks
+    per worker are in flight at once, so the diff is still consumed as a stream.
+    """
+    # Imported here as multiprocessing is slow to load and only needed with `--jobs`
+    from concurrent.futures import ProcessPoolExecutor
+
+    infos = iter(diff_infos)
+    render = partial(render_chunk, plain=plain, grep=grep, words=words)
+    pending: deque[tuple[list[DiffInfoPG2], Future]] = deque()
+    pool = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        while True:
+            while len(pending) < 2 * jobs:
+                chunk = list(islice(infos, chunk_size))
+                if not chunk:
+                    break
+                payload = [(info.overview, info.data) for info in chunk]
+                pending.append((chunk, pool.submit(render, payload)))
+            if not pending:
+                break
+            chunk, future = pending.popleft()
+            for info, (line_count, rendered) in zip(chunk, future.result()):
+                yield info, line_count, rendered
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
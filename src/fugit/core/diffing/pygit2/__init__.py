@@ -1,3 +1,4 @@
-from .structures import DiffInfoPG2
+from .pathspecs import diff_tree_to_index
+from .structures import DeltaStatus, DiffInfoPG2, DiffRecord
 
-__all__ = ("DiffInfoPG2",)
+__all__ = ("DeltaStatus", "DiffInfoPG2", "DiffRecord", "diff_tree_to_index")
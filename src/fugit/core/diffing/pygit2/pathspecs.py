@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from pygit2 import C, Diff, Repository, Tree, ffi
+from pygit2.errors import check_error
+
+__all__ = ("diff_tree_to_index",)
+
+
+def diff_tree_to_index(repo: Repository, revision: str, pathspec: list[str]) -> Diff:
+    """
+    Diff the revision's tree against the index like `repo.diff(revision, cached=True)`,
+    but with the pathspec set in the diff options so libgit2 skips non-matching entries
+    while walking the tree and index, before any delta or patch is made for them.
+    pygit2 does not expose the diff options' pathspec, so this goes through its cffi
+    bindings as `Index.diff_to_tree` does. The pathspec's strings are allocated here
+    rather than with pygit2's `StrArray`, whose API differs between versions.
+    """
+    tree = repo.revparse_single(revision).peel(Tree)
+    if not pathspec:
+        return repo.diff(tree, cached=True)
+    index = repo.index
+    copts = ffi.new("git_diff_options *")
+    check_error(C.git_diff_options_init(copts, 1))
+    ctree = ffi.new("git_tree **")
+    ffi.buffer(ctree)[:] = tree._pointer[:]
+    # The strings must outlive the call, so are held in locals until it returns
+    paths = [ffi.new("char[]", path.encode()) for path in pathspec]
+    strings = ffi.new("char *[]", paths)
+    copts.pathspec.strings = strings
+    copts.pathspec.count = len(paths)
+    cdiff = ffi.new("git_diff **")
+    err = C.git_diff_tree_to_index(cdiff, repo._repo, ctree[0], index._index, copts)
+    check_error(err)
+    return Diff.from_c(bytes(ffi.buffer(cdiff)[:]), repo)
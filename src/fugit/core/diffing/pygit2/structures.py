@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
 from enum import Enum, IntEnum
-from typing import Literal
+from functools import cached_property
+from itertools import accumulate, chain
+from operator import attrgetter
+from typing import Any, Literal
 
+import msgspec
 from msgspec import Struct
 
-__all__ = ("DiffInfoPG2",)
+__all__ = ("DeltaStatus", "DiffInfoPG2", "DiffRecord")
 
 
 class DiffFile(Struct):
@@ -55,6 +61,10 @@ class DeltaStatus(IntEnum):
     UNREADABLE = 9
     CONFLICTED = 10
 
+    @property
+    def change_type(self) -> str:
+        return GitDeltaStatus[self.name].value
+
 
 class DiffDelta(Struct):
     # flags: int
@@ -73,24 +83,212 @@ class DiffLine(Struct):
     new_lineno: int
     num_lines: int
     old_lineno: int
-    origin: Literal[" ", "-", "+"]  # Alternatively use to discriminate union
+    # The last three mark a missing newline at the end of the file (on either side)
+    origin: Literal[" ", "-", "+", "=", ">", "<"]
     # raw_content: bytes
 
 
+LINE_FIELDS = attrgetter(*DiffLine.__struct_fields__)
+"""Read a line's fields (from a pygit2 `DiffLine` or our own) in `DiffLine` order."""
+
+
+LINE_ARRAYS = {
+    "ends": "q",
+    "content_offsets": "q",
+    "new_linenos": "i",
+    "num_lines": "i",
+    "old_linenos": "i",
+}
+"""The `DiffLines` columns held as arrays, and their type codes."""
+
+
+class LineColumns(Struct, array_like=True):
+    """The columns of `DiffLines` as stored in the diff cache, the arrays as bytes."""
+
+    contents: str
+    ends: bytes
+    content_offsets: bytes
+    new_linenos: bytes
+    num_lines: bytes
+    old_linenos: bytes
+    origins: str
+
+
+class DiffLines(Sequence[DiffLine]):
+    """
+    A hunk's lines stored column-wise: each field in an array (or string, for the
+    origins), and the contents concatenated into one string with the end of each line's
+    content in `ends`. A `DiffLine` is only made for a line when it is accessed, so a
+    hunk is a handful of objects however many lines it has, none tracked by the GC.
+    """
+
+    __slots__ = (
+        "contents",
+        "ends",
+        "content_offsets",
+        "new_linenos",
+        "num_lines",
+        "old_linenos",
+        "origins",
+    )
+
+    def __init__(
+        self,
+        contents: str = "",
+        ends: array[int] | None = None,
+        content_offsets: array[int] | None = None,
+        new_linenos: array[int] | None = None,
+        num_lines: array[int] | None = None,
+        old_linenos: array[int] | None = None,
+        origins: str = "",
+    ):
+        self.contents = contents
+        self.ends = array("q") if ends is None else ends
+        self.content_offsets = (
+            array("q") if content_offsets is None else content_offsets
+        )
+        self.new_linenos = array("i") if new_linenos is None else new_linenos
+        self.num_lines = array("i") if num_lines is None else num_lines
+        self.old_linenos = array("i") if old_linenos is None else old_linenos
+        self.origins = origins
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[Any]) -> DiffLines:
+        """Transpose objects with `DiffLine` fields (e.g. pygit2's) into columns."""
+        rows = list(map(LINE_FIELDS, lines))
+        if not rows:
+            return cls()
+        contents, offsets, new_linenos, num_lines, old_linenos, origins = zip(*rows)
+        return cls(
+            contents="".join(contents),
+            ends=array("q", accumulate(map(len, contents))),
+            content_offsets=array("q", offsets),
+            new_linenos=array("i", new_linenos),
+            num_lines=array("i", num_lines),
+            old_linenos=array("i", old_linenos),
+            origins="".join(origins),
+        )
+
+    @classmethod
+    def from_columns(cls, columns: LineColumns) -> DiffLines:
+        arrays = {}
+        for name, typecode in LINE_ARRAYS.items():
+            arrays[name] = array(typecode)
+            arrays[name].frombytes(getattr(columns, name))
+        return cls(contents=columns.contents, origins=columns.origins, **arrays)
+
+    def columns(self) -> LineColumns:
+        arrays = {name: getattr(self, name).tobytes() for name in LINE_ARRAYS}
+        return LineColumns(contents=self.contents, origins=self.origins, **arrays)
+
+    def __len__(self) -> int:
+        return len(self.origins)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = range(len(self))[index]  # Count back from the end, or raise IndexError
+        start = self.ends[index - 1] if index else 0
+        return DiffLine(
+            self.contents[start : self.ends[index]],
+            self.content_offsets[index],
+            self.new_linenos[index],
+            self.num_lines[index],
+            self.old_linenos[index],
+            self.origins[index],
+        )
+
+    def __iter__(self) -> Iterator[DiffLine]:
+        bounds = map(slice, chain((0,), self.ends), self.ends)
+        return map(
+            DiffLine,
+            map(self.contents.__getitem__, bounds),
+            self.content_offsets,
+            self.new_linenos,
+            self.num_lines,
+            self.old_linenos,
+            self.origins,
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, DiffLines):
+            return self.columns() == other.columns()
+        if isinstance(other, Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({list(self)!r})"
+
+
 class DiffHunk(Struct):
-    # new_start: int
-    # new_lines: int
-    # old_start: int
-    # old_lines: int
+    new_start: int
+    new_lines: int
+    old_start: int
+    old_lines: int
     header: str  # This might be a string that represents the hunk header
-    # Including lines might require another model if they have a complex structure
-    lines: list[DiffLine]
+    lines: Sequence[DiffLine]
+    """`DiffLines` columns once converted, or a list when decoded from a record."""
 
 
-class DiffPatch(Struct):
+class StoredHunk(Struct, array_like=True):
+    """A hunk as stored in the diff cache, with its lines as columns."""
+
+    new_start: int
+    new_lines: int
+    old_start: int
+    old_lines: int
+    header: str
+    lines: LineColumns
+
+    @classmethod
+    def from_hunk(cls, hunk: DiffHunk) -> StoredHunk:
+        lines = hunk.lines
+        if not isinstance(lines, DiffLines):
+            lines = DiffLines.from_lines(lines)
+        return cls(
+            hunk.new_start,
+            hunk.new_lines,
+            hunk.old_start,
+            hunk.old_lines,
+            hunk.header,
+            lines.columns(),
+        )
+
+    def to_hunk(self) -> DiffHunk:
+        return DiffHunk(
+            self.new_start,
+            self.new_lines,
+            self.old_start,
+            self.old_lines,
+            self.header,
+            DiffLines.from_columns(self.lines),
+        )
+
+
+def parse_patch(data: bytes) -> Any:
+    """
+    Parse a file's patch text back into a `pygit2.Patch`, or `None` if the text holds
+    no patch (e.g. the summary of a skipped large file).
+    """
+    from pygit2 import Diff, GitError
+
+    try:
+        return next(iter(Diff.parse_diff(data)), None)
+    except GitError:
+        return None
+
+
+class DiffPatch(Struct, dict=True):
+    """
+    Only the delta and the patch's raw bytes are converted up front, which is all the
+    text renderer needs. The text is decoded, and the hunks (and their lines) are
+    decoded from the source patch, on first access by structured consumers, so text
+    output never builds `DiffHunk`/`DiffLines` or even decodes the patch.
+    """
+
     delta: DiffDelta
-    hunks: list[DiffHunk]
-    text: str
+    data: bytes
     # line_stats: tuple[int, int, int] = Field(repr=False, exclude=True)
 
     # @computed_field
@@ -108,11 +306,56 @@ class DiffPatch(Struct):
     # def deletions(self) -> int:
     #     return self.line_stats[2]
 
+    @classmethod
+    def from_patch(cls, patch: Any) -> DiffPatch:
+        """Convert a `pygit2.Patch`, keeping it as the source for lazily decoded hunks."""
+        diff_patch = msgspec.convert(patch, cls, from_attributes=True)
+        diff_patch._hunk_source = patch
+        return diff_patch
+
+    @cached_property
+    def text(self) -> str:
+        """The patch decoded as pygit2 would, replacing any invalid UTF-8."""
+        return self.data.decode(errors="replace")
+
+    @cached_property
+    def hunks(self) -> list[DiffHunk]:
+        """
+        Decode the hunks from either a libgit2 patch or msgpack from the diff cache, or
+        parse them from the patch text if that's all the cache kept (in which case the
+        lines' content offsets index the patch text rather than the blobs).
+        """
+        source = getattr(self, "_hunk_source", None)
+        if isinstance(source, bytes):
+            source = parse_patch(source)
+        match source:
+            case None:
+                return []
+            case msgspec.Raw() as encoded:
+                stored = msgspec.msgpack.decode(encoded, type=list[StoredHunk])
+                hunks = [stored_hunk.to_hunk() for stored_hunk in stored]
+            case patch:
+                hunks = [
+                    DiffHunk(
+                        hunk.new_start,
+                        hunk.new_lines,
+                        hunk.old_start,
+                        hunk.old_lines,
+                        hunk.header,
+                        DiffLines.from_lines(hunk.lines),
+                    )
+                    for hunk in patch.hunks
+                ]
+        del self._hunk_source  # Release the source once decoded
+        if (indices := self.__dict__.pop("_hunk_indices", None)) is not None:
+            hunks = [hunks[index] for index in indices]  # Narrowed by `--grep`
+        return hunks
+
 
 class DiffInfoPG2(DiffPatch):
     @property
     def change_type(self) -> str:
-        return GitDeltaStatus[self.delta.status.name].value
+        return self.delta.status.change_type
 
     @property
     def paths_repr(self) -> str:
@@ -124,3 +367,20 @@ class DiffInfoPG2(DiffPatch):
     @property
     def overview(self) -> str:
         return f"{self.change_type}: {self.paths_repr}\n"
+
+
+class DiffRecord(Struct):
+    """A file's diff in full, as emitted by the machine-readable output formats."""
+
+    change_type: str
+    delta: DiffDelta
+    hunks: list[DiffHunk]
+
+    @classmethod
+    def from_info(cls, diff_info: DiffInfoPG2) -> DiffRecord:
+        """Give each hunk its lines as a list of `DiffLine`s, to be encoded."""
+        hunks = [
+            msgspec.structs.replace(hunk, lines=list(hunk.lines))
+            for hunk in diff_info.hunks
+        ]
+        return cls(diff_info.change_type, diff_info.delta, hunks)
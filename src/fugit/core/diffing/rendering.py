@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+from ..text.bases import Span, SpannedText, Style
+from ..text.escaping import esc_pair
+from ..text.palette import (
+    BLUE,
+    BOLD,
+    BOLD_YELLOW_US,
+    GREEN,
+    RED,
+    RESET,
+    WHITE,
+    YELLOW,
+)
+from ..text.scanning import compile_re
+from .words import highlight_words
+
+# from line_profiler import profile
+
+
+__all__ = (
+    "highlight_regex",
+    "highlight_diff",
+    "render_diff",
+    "highlight_matches",
+    "render_chunk",
+    "render_commit",
+    "render_cluster",
+)
+
+
+highlight_patterns = {
+    "hunk_context": (r"^@@.*", Style.W),  # applied first (whole line)
+    "hunk_header": (r"^@@.*?@@ ", Style.b),  # applied second (only inside @ signs)
+}
+
+
+def highlight_regex(line: SpannedText, style_patterns: list[tuple[str, str]]) -> None:
+    for pattern, style in style_patterns:
+        for hit in compile_re(pattern).finditer(line.line):
+            start, stop = hit.span()
+            span = Span(start=start, stop=stop, style=style)
+            line.spans.append(span)
+    return
+
+
+LINE_START = f"\n{RESET}{WHITE}".encode()
+"""Every line break is first replaced by this, styling each line as context."""
+
+RESTYLED_STARTS = tuple(
+    (context.encode(), styled.encode())
+    for context, styled in ((f"{WHITE}+", f"{GREEN}+"), (f"{WHITE}-", f"{RED}-"))
+)
+"""The context style at the start of added and removed lines, and its replacement."""
+
+HUNK_RANGE_STYLE = f"{BOLD}{BLUE}".encode()
+RESET_BYTES = RESET.encode()
+WHITE_SIZE = len(WHITE)
+
+HEADER_DROPPED = (b"d", b"i", b"--", b"++")
+"""The `diff`/`index` and `---`/`+++` lines (the overview stands in for them)."""
+
+
+def split_patch_header(data: bytes) -> tuple[bytes, bytes]:
+    """Split a file's patch into its header and its body (from the first hunk)."""
+    if data.startswith(b"@@"):
+        return b"", data
+    if body_start := data.find(b"\n@@") + 1:
+        return data[:body_start], data[body_start:]
+    return data, b""
+
+
+def keep_header_line(line: bytes) -> bool:
+    return not line.startswith(HEADER_DROPPED)
+
+
+def count_lines(data: bytes) -> int:
+    return data.count(b"\n") + bool(data and not data.endswith(b"\n"))
+
+
+def style_hunk_ranges(body: bytes) -> bytes:
+    """Style the "@@ -a,b +c,d @@" range at the start of each hunk's first line."""
+    pieces = []
+    pos = start = 0
+    while (close := body.find(b"@@", start + 2)) != -1:
+        pieces += [body[pos:start], HUNK_RANGE_STYLE, body[start : close + 2]]
+        pieces.append(RESET_BYTES)
+        pos = close + 2
+        if (start := body.find(b"\n@@", pos) + 1) == 0:
+            break
+    pieces.append(body[pos:])
+    return b"".join(pieces)
+
+
+# @profile
+def highlight_diff(
+    data: bytes,
+    plain: bool = False,
+    grep: str = "",
+    words: bool = False,
+) -> tuple[int, bytes]:
+    """
+    Highlight a file's patch bytes as one buffer, giving its line count and the bytes
+    to write out. Rather than splitting the patch into lines, every line break is
+    replaced in one pass to style all lines as context, then added and removed lines
+    are restyled by replacing the escape before their origin character. Each pass is
+    one `bytes.replace` over the whole patch, whose needle ends on a byte rare enough
+    for the search to skip through most of it. The patch is never decoded, so content
+    that isn't UTF-8 is written out exactly as libgit2 gave it. With `words`, the
+    changed words of paired removed and added lines are marked too (unless matches of
+    `grep` are being highlighted).
+    """
+    header, body = split_patch_header(data)
+    header = b"".join(filter(keep_header_line, header.splitlines(keepends=True)))
+    if plain or not body:
+        return count_lines(header) + count_lines(body), header + body
+    if grep:
+        # Escaped surrogates carry any invalid UTF-8 through the regex search intact
+        text = body.decode(errors="surrogateescape")
+        body = highlight_matches(text, grep).encode(errors="surrogateescape")
+    elif words:
+        body = highlight_words(body)
+    body = style_hunk_ranges(body)
+    unbroken_size = len(body)
+    body = body.replace(b"\n", LINE_START)
+    # Each line break grew by the same amount, so they are counted without a scan
+    line_breaks = (len(body) - unbroken_size) // (len(LINE_START) - 1)
+    line_count = count_lines(header) + line_breaks + (not body.endswith(LINE_START))
+    for context_start, styled_start in RESTYLED_STARTS:
+        body = body.replace(context_start, styled_start)
+    if body.endswith(LINE_START):
+        body = body[:-WHITE_SIZE]  # Nothing follows the final line break
+    else:
+        body += RESET_BYTES
+    return line_count, header + body
+
+
+def render_diff(
+    overview: str,
+    data: bytes,
+    plain: bool = False,
+    grep: str = "",
+    words: bool = False,
+) -> tuple[int, bytes]:
+    """
+    Render a file's header and highlighted patch as one bytestring, giving the number
+    of lines output. Matches of the `grep` pattern (if any) on changed lines are
+    highlighted too.
+    """
+    header = overview if plain else f"{BOLD_YELLOW_US}{overview}{RESET}"
+    line_count, highlighted = highlight_diff(data, plain, grep, words)
+    return line_count + 1, header.encode() + highlighted
+
+
+def highlight_matches(body: str, pattern: str) -> str:
+    """Style the pattern's matches within the added and removed lines of a patch body."""
+    text = SpannedText(line=body)
+    highlight_regex(text, [(pattern, Style.Y_)])
+    on, off = esc_pair(Style.Y_.value)
+    line_styles = {"+": GREEN, "-": RED}
+    pieces = []
+    pos = 0
+    for span in text.spans:
+        line_start = body.rfind("\n", 0, span.start) + 1
+        # Leave the origin character unstyled, so the line style can still be applied
+        start = max(span.start, line_start + 1, pos)
+        line_style = line_styles.get(body[line_start])
+        if line_style is None or start >= span.stop:
+            continue
+        pieces += [body[pos:start], on, body[start : span.stop], off, line_style]
+        pos = span.stop
+    pieces.append(body[pos:])
+    return "".join(pieces)
+
+
+def render_commit(commit_id: str, summary: str, plain: bool = False) -> str:
+    """Render the line introducing a commit's diffs in commit range mode."""
+    if plain:
+        return f"commit {commit_id} {summary}\n"
+    return f"{YELLOW}commit {commit_id}{RESET} {summary}\n"
+
+
+def render_cluster(
+    count: int,
+    file_count: int,
+    paths: list[str],
+    sample: str,
+    plain: bool = False,
+    words: bool = False,
+) -> tuple[int, bytes]:
+    """Render a distinct change found by hunk clustering, headed by where it occurs."""
+    files = ", ".join(paths)
+    if (unlisted := file_count - len(paths)) > 0:
+        files += f" (+{unlisted} more)"
+    noun = "file" if file_count == 1 else "files"
+    overview = f"{count}x in {file_count} {noun}: {files}\n"
+    return render_diff(overview, sample.encode(), plain=plain, words=words)
+
+
+def render_unsampled(cluster_count: int, hunk_count: int, plain: bool = False) -> str:
+    """Note the rarer distinct changes that clustering kept no sample of to show."""
+    noun = "change" if cluster_count == 1 else "changes"
+    note = f"{cluster_count} more distinct {noun} ({hunk_count} hunks) not shown\n"
+    return note if plain else f"{BOLD}{note}{RESET}"
+
+
+def render_chunk(
+    chunk: list[tuple[str, bytes]],
+    plain: bool = False,
+    grep: str = "",
+    words: bool = False,
+) -> list[tuple[int, bytes]]:
+    """
+    Render a chunk of (overview, patch bytes) pairs in a worker process, sending back
+    one bytestring per file to the parent.
+    """
+    return [render_diff(overview, data, plain, grep, words) for overview, data in chunk]
@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import zlib
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+from contextlib import suppress
+from pathlib import Path
+
+import msgspec
+from pygit2 import DiffDelta as GitDiffDelta
+from pygit2 import DiffFile as GitDiffFile
+from pygit2 import Oid, Repository
+
+from ...interfaces import DiffConfig
+from .limits import FileGuard
+from .pygit2 import DeltaStatus
+
+__all__ = (
+    "SimilarDelta",
+    "SignatureCache",
+    "blob_signature",
+    "similarity",
+    "detects_similar",
+    "find_similar",
+)
+
+SHARD_LIMIT = 512
+"""Signatures kept per on-disk shard (of 256), beyond which the oldest are dropped."""
+
+COMMON_LINE = 32
+"""Lines in more sources than this are too common to pick out rename candidates."""
+
+Signature = Counter[int]
+"""How many times each line (by its CRC32) occurs in a blob."""
+
+
+class SimilarDelta:
+    """
+    A rename or copy found by `find_similar`, with the attributes of a pygit2 `DiffDelta`
+    that the file header and blob pair patch are made from, so it renders the same way.
+    """
+
+    __slots__ = ("old_file", "new_file", "status", "similarity")
+
+    def __init__(
+        self,
+        old_file: GitDiffFile,
+        new_file: GitDiffFile,
+        status: DeltaStatus,
+        similarity: int,
+    ):
+        self.old_file = old_file
+        self.new_file = new_file
+        self.status = status
+        self.similarity = similarity
+
+    def status_char(self) -> str:
+        return self.status.change_type
+
+
+def blob_signature(data: bytes) -> Signature:
+    return Counter(map(zlib.crc32, data.splitlines()))
+
+
+def similarity(a: Signature, b: Signature) -> int:
+    """
+    The percentage of lines in common, out of the larger blob's lines. Unlike libgit2's
+    hashed chunks of bytes this counts whole lines, but likewise ignores their order.
+    """
+    if a.total() > b.total():
+        a, b = b, a
+    if not (larger := b.total()):
+        return 100
+    common = sum(min(count, b[line]) for line, count in a.items() if line in b)
+    return 100 * common // larger
+
+
+class StoredSignature(msgspec.Struct, array_like=True):
+    lines: list[int]
+    counts: list[int]
+
+
+class SignatureCache:
+    """
+    Memoise the signature of each blob by its OID. As a blob's content never changes
+    nor does its signature, so entries are never stale: they are kept on disk under
+    `root` (if given) for later runs, in 256 shards by the OID's first byte. Each shard
+    keeps at most `SHARD_LIMIT` signatures, dropping the oldest first.
+    """
+
+    repo: Repository
+    root: Path | None
+    hits: int
+    misses: int
+
+    def __init__(self, repo: Repository, root: Path | None = None):
+        self.repo = repo
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+        self._memo: dict[Oid, Signature] = {}
+        self._shards: dict[str, dict[str, StoredSignature]] = {}
+        self._dirty: set[str] = set()
+        self._decoder = msgspec.msgpack.Decoder(dict[str, StoredSignature])
+
+    def shard(self, name: str) -> dict[str, StoredSignature]:
+        if (shard := self._shards.get(name)) is None:
+            shard = self._shards[name] = {}
+            if self.root is not None:
+                try:
+                    shard.update(self._decoder.decode((self.root / name).read_bytes()))
+                except (OSError, msgspec.DecodeError):
+                    pass  # Not written yet (or unreadable, so rewritten when saved)
+        return shard
+
+    def get(self, oid: Oid) -> Signature:
+        if (signature := self._memo.get(oid)) is not None:
+            return signature
+        hex_oid = str(oid)
+        shard = self.shard(hex_oid[:2])
+        if (stored := shard.get(hex_oid)) is not None:
+            self.hits += 1
+            signature = Counter(dict(zip(stored.lines, stored.counts)))
+        else:
+            self.misses += 1
+            signature = blob_signature(self.repo[oid].data)
+            shard[hex_oid] = StoredSignature(list(signature), list(signature.values()))
+            self._dirty.add(hex_oid[:2])
+        self._memo[oid] = signature
+        return signature
+
+    def save(self) -> None:
+        """
+        Write out the shards that gained signatures, each replaced atomically from its
+        own temporary file (so concurrent savers, in threads or processes, never write
+        to the same one). If the cache can't be written the signatures are just not
+        kept.
+        """
+        if self.root is None:
+            return
+        with suppress(OSError):
+            self.root.mkdir(parents=True, exist_ok=True)
+            for name in self._dirty:
+                shard = self._shards[name]
+                for hex_oid in list(shard)[: max(len(shard) - SHARD_LIMIT, 0)]:
+                    del shard[hex_oid]
+                self._write_shard(name, msgspec.msgpack.encode(shard))
+        self._dirty.clear()
+
+    def _write_shard(self, name: str, data: bytes) -> None:
+        shard_file = tempfile.NamedTemporaryFile(
+            dir=self.root, prefix=f"{name}.", suffix=".tmp", delete=False
+        )
+        try:
+            with shard_file:
+                shard_file.write(data)
+            os.replace(shard_file.name, self.root / name)
+        except OSError:
+            with suppress(OSError):
+                os.unlink(shard_file.name)
+            raise
+
+
+def detects_similar(config: DiffConfig) -> bool:
+    return bool(config.rename_threshold or config.rename_copy_threshold)
+
+
+def candidate_sources(
+    target_sig: Signature,
+    threshold: int,
+    index: dict[int, list[int]],
+    n_sources: int,
+) -> Iterable[int]:
+    """
+    The sources that share a line with the target, looked up in the `index` of which
+    sources each line occurs in. Lines in more than `COMMON_LINE` sources (blank lines,
+    boilerplate) don't nominate any, unless those alone could make up the `threshold`
+    share of the target, in which case every source is a candidate.
+    """
+    candidates: set[int] = set()
+    common = 0
+    for line, count in target_sig.items():
+        sources = index.get(line, ())
+        if len(sources) > COMMON_LINE:
+            common += count
+        else:
+            candidates.update(sources)
+    if 100 * common >= threshold * target_sig.total():
+        return range(n_sources)
+    return candidates
+
+
+def best_matches(
+    targets: list[Oid],
+    sources: list[Oid],
+    threshold: int,
+    signatures: SignatureCache,
+    exclusive: bool,
+) -> dict[int, tuple[int, int]]:
+    """
+    Score every (target, source) blob pair that could reach the `threshold`, and match
+    each target index to its most similar source index and score, best scores first.
+    With `exclusive` (for renames) each source is matched at most once.
+    """
+    target_sigs = [signatures.get(oid) for oid in targets]
+    source_sigs = [signatures.get(oid) for oid in sources]
+    source_sizes = [source_sig.total() for source_sig in source_sigs]
+    index: dict[int, list[int]] = defaultdict(list)
+    for s, source_sig in enumerate(source_sigs):
+        for line in source_sig:
+            index[line].append(s)
+    scored = []
+    for t, target_sig in enumerate(target_sigs):
+        target_size = target_sig.total()
+        for s in candidate_sources(target_sig, threshold, index, len(sources)):
+            # The smaller blob's share of the larger bounds the similarity
+            smaller, larger = sorted((target_size, source_sizes[s]))
+            if 100 * smaller < threshold * larger:
+                continue
+            if (score := similarity(target_sig, source_sigs[s])) >= threshold:
+                scored.append((score, t, s))
+    matches: dict[int, tuple[int, int]] = {}
+    used: set[int] = set()
+    for score, t, s in sorted(scored, key=lambda item: -item[0]):
+        if t in matches or (exclusive and s in used):
+            continue
+        matches[t] = s, score
+        used.add(s)
+    return matches
+
+
+def find_similar(
+    deltas: Iterable[GitDiffDelta],
+    config: DiffConfig,
+    signatures: SignatureCache,
+    guard: FileGuard | None = None,
+) -> list[tuple[int, GitDiffDelta | SimilarDelta]]:
+    """
+    Pair up added files with the deleted files they were renamed from (or, given a copy
+    threshold, the deleted or modified files they were copied from), in place of their
+    additions (and the deletions). Each delta is given with its position in `deltas`,
+    a rename or copy taking that of the addition. Identical blobs are paired by OID
+    first, in linear time. The quadratic search over the rest is skipped if there are
+    more than `rename_limit` of either, like git's `diff.renameLimit`. Blobs that the
+    `guard` would summarise (over its byte limit, or known to be binary) are left out
+    of that search, so they are never loaded to be hashed.
+    """
+    deltas = list(deltas)
+
+    def searched(indices: Iterable[int], side: str) -> list[int]:
+        if guard is None:
+            return list(indices)
+        return [i for i in indices if not guard.skips(getattr(deltas[i], side))]
+
+    added = [i for i, delta in enumerate(deltas) if delta.status == DeltaStatus.ADDED]
+    found: dict[int, SimilarDelta] = {}
+    removed: set[int] = set()
+
+    def pair(i: int, old_file: GitDiffFile, status: DeltaStatus, score: int) -> None:
+        found[i] = SimilarDelta(old_file, deltas[i].new_file, status, score)
+
+    if config.rename_threshold and added:
+        deleted = [i for i, d in enumerate(deltas) if d.status == DeltaStatus.DELETED]
+        by_oid = {deltas[i].old_file.id: i for i in reversed(deleted)}
+        for i in added:
+            if (source := by_oid.pop(deltas[i].new_file.id, None)) is not None:
+                pair(i, deltas[source].old_file, DeltaStatus.RENAMED, 100)
+                removed.add(source)
+        targets = searched((i for i in added if i not in found), "new_file")
+        sources = searched((i for i in deleted if i not in removed), "old_file")
+        if (
+            targets
+            and sources
+            and max(len(targets), len(sources)) <= config.rename_limit
+        ):
+            matches = best_matches(
+                [deltas[i].new_file.id for i in targets],
+                [deltas[i].old_file.id for i in sources],
+                config.rename_threshold,
+                signatures,
+                exclusive=True,
+            )
+            for t, (s, score) in matches.items():
+                pair(
+                    targets[t], deltas[sources[s]].old_file, DeltaStatus.RENAMED, score
+                )
+                removed.add(sources[s])
+    if config.rename_copy_threshold and added:
+        copied = (DeltaStatus.DELETED, DeltaStatus.MODIFIED)
+        sources = searched(
+            (i for i, d in enumerate(deltas) if d.status in copied), "old_file"
+        )
+        targets = searched((i for i in added if i not in found), "new_file")
+        if (
+            targets
+            and sources
+            and max(len(targets), len(sources)) <= config.rename_limit
+        ):
+            matches = best_matches(
+                [deltas[i].new_file.id for i in targets],
+                [deltas[i].old_file.id for i in sources],
+                config.rename_copy_threshold,
+                signatures,
+                exclusive=False,
+            )
+            for t, (s, score) in matches.items():
+                pair(targets[t], deltas[sources[s]].old_file, DeltaStatus.COPIED, score)
+    return [
+        (i, found.get(i, delta)) for i, delta in enumerate(deltas) if i not in removed
+    ]
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+
+from msgspec import Struct
+from pygit2 import DiffDelta as GitDiffDelta
+from pygit2 import Patch
+
+from ..text.palette import GREEN, RED, RESET
+from .limits import SkippedFile
+from .pygit2 import DiffInfoPG2
+from .pygit2.structures import DiffDelta
+from .rendering import split_patch_header
+
+__all__ = (
+    "FileStat",
+    "iter_file_stats",
+    "iter_text_stats",
+    "render_numstat",
+    "render_stat",
+)
+
+MAX_GRAPH_WIDTH = 40
+"""As for `git diff --stat`, the +/- graph never takes more than 40 columns."""
+
+
+class FileStat(Struct):
+    path: str
+    additions: int
+    deletions: int
+    binary: bool
+    skipped: bool = False
+
+    @property
+    def changes(self) -> int:
+        return self.additions + self.deletions
+
+    @property
+    def counted(self) -> bool:
+        return not (self.binary or self.skipped)
+
+    @property
+    def label(self) -> str:
+        """What stands in for the line count of a file that has none."""
+        return "Bin" if self.binary else "Skip"
+
+
+def stat_path(delta: GitDiffDelta | DiffDelta) -> str:
+    old, new = delta.old_file.path, delta.new_file.path
+    return new if old == new else f"{old} => {new}"
+
+
+def iter_file_stats(patches: Iterable[Patch | SkippedFile]) -> Iterator[FileStat]:
+    """
+    Read libgit2's per-patch line stats, without converting any hunks or building the
+    patch text in Python. Skipped files have no patch, so no line counts.
+    """
+    for patch in patches:
+        delta = patch.delta
+        path = stat_path(delta)
+        if isinstance(patch, SkippedFile):
+            yield FileStat(path, 0, 0, binary=patch.binary, skipped=True)
+            continue
+        _, additions, deletions = patch.line_stats
+        yield FileStat(path, additions, deletions, binary=bool(delta.is_binary))
+
+
+def iter_text_stats(diff_infos: Iterable[DiffInfoPG2]) -> Iterator[FileStat]:
+    """
+    Count each file's added and removed lines from its patch text, for patches narrowed
+    to the hunks matching `--grep` (which libgit2's line stats would overcount). Only
+    files with a matching changed line get this far, so none are binary or skipped.
+    """
+    for diff_info in diff_infos:
+        _, body = split_patch_header(diff_info.data)
+        additions, deletions = body.count(b"\n+"), body.count(b"\n-")
+        yield FileStat(stat_path(diff_info.delta), additions, deletions, binary=False)
+
+
+def render_numstat(stat: FileStat) -> str:
+    """Render a `git diff --numstat` line (binary or skipped files have no counts)."""
+    if not stat.counted:
+        return f"-\t-\t{stat.path}\n"
+    return f"{stat.additions}\t{stat.deletions}\t{stat.path}\n"
+
+
+def render_stat(stats: list[FileStat], width: int, plain: bool = False) -> list[str]:
+    """
+    Render a `git diff --stat` histogram sized to fit `width` columns, followed by a
+    totals line. Paths are truncated from the left and bars scaled down if need be.
+    """
+    if not stats:
+        return []
+    max_changes = max(stat.changes for stat in stats)
+    count_width = len(str(max_changes))
+    if labels := [stat.label for stat in stats if not stat.counted]:
+        count_width = max(count_width, *map(len, labels))
+    name_width = max(len(stat.path) for stat in stats)
+    # Each line is laid out as " {name} | {count} {graph}"
+    available = width - count_width - 5
+    graph_width = min(max_changes, MAX_GRAPH_WIDTH)
+    if name_width + graph_width > available:
+        # Like git, give the graph up to 3/8 of the width and the name the rest
+        graph_width = max(min(graph_width, width * 3 // 8 - count_width - 5), 6)
+        name_width = max(min(name_width, available - graph_width), 4)
+    plus, minus, reset = ("", "", "") if plain else (GREEN, RED, RESET)
+    lines = []
+    for stat in stats:
+        path = stat.path
+        if len(path) > name_width:
+            path = "..." + path[len(path) - name_width + 3 :]
+        if not stat.counted:
+            lines.append(f" {path:<{name_width}} | {stat.label:>{count_width}}\n")
+            continue
+        adds, dels = stat.additions, stat.deletions
+        if max_changes > graph_width:
+            total = scale(adds + dels, graph_width, max_changes)
+            adds = scale(adds, graph_width, max_changes)
+            dels = total - adds
+        bar = (f"{plus}{'+' * adds}{reset}" if adds else "") + (
+            f"{minus}{'-' * dels}{reset}" if dels else ""
+        )
+        lines.append(f" {path:<{name_width}} | {stat.changes:>{count_width}} {bar}\n")
+    lines.append(render_totals(stats))
+    return lines
+
+
+def scale(n: int, width: int, max_changes: int) -> int:
+    """Scale a count linearly onto the graph, keeping any non-zero count visible."""
+    return 0 if n == 0 else 1 + (n * (width - 1) // max_changes)
+
+
+def render_totals(stats: list[FileStat]) -> str:
+    files = len(stats)
+    additions = sum(stat.additions for stat in stats)
+    deletions = sum(stat.deletions for stat in stats)
+    parts = [f"{files} file{'s' * (files != 1)} changed"]
+    if additions:
+        parts.append(f"{additions} insertion{'s' * (additions != 1)}(+)")
+    if deletions:
+        parts.append(f"{deletions} deletion{'s' * (deletions != 1)}(-)")
+    return " " + ", ".join(parts) + "\n"
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import re
+import string
+
+from ..text.bases import Span, SpannedText, Style
+from ..text.palette import GREEN, RED
+
+__all__ = ("changed_spans", "highlight_words")
+
+MAX_LINE_LENGTH = 400
+"""Paired lines longer than this many bytes are left as whole-line changes."""
+MAX_BLOCK_LINES = 1000
+"""Runs of more than this many removed (or added) lines are left unrefined."""
+
+CHANGE_BLOCK = re.compile(rb"^(?:-.*\n)+(?:\+.*\n)*", re.MULTILINE)
+"""A run of removed lines and any added lines replacing them. The added lines are
+optional so that a run of removals alone still matches, rather than being retried from
+each of its lines (which would take quadratic time)."""
+WORD_BYTES = f"{string.ascii_letters}{string.digits}_".encode() + bytes(range(128, 256))
+"""Bytes in words, including all non-ASCII so that no UTF-8 character is split up."""
+WORD_SET = frozenset(WORD_BYTES)
+TOKEN = re.compile(rb"[%s]+|\s+|." % re.escape(WORD_BYTES), re.DOTALL)
+CHANGED = Style.v
+
+
+def common_affixes(old: bytes, new: bytes) -> tuple[int, int]:
+    """
+    The lengths of the common prefix and (not overlapping it) suffix of two lines, each
+    found in one step by XOR-ing the lines' bytes as integers: the highest set bit is
+    in the first byte to differ, and the lowest set bit in the last.
+    """
+    size = min(len(old), len(new))
+    diff = int.from_bytes(old[:size], "big") ^ int.from_bytes(new[:size], "big")
+    head = size - (diff.bit_length() + 7) // 8
+    if not (size := size - head):
+        return head, 0
+    diff = int.from_bytes(old[-size:], "big") ^ int.from_bytes(new[-size:], "big")
+    tail = ((diff & -diff).bit_length() - 1) // 8 if diff else size
+    return head, tail
+
+
+def in_word(line: bytes, pos: int) -> bool:
+    return 0 <= pos < len(line) and line[pos] in WORD_SET
+
+
+def token_spans(tokens: list[bytes], other: set[bytes], start: int) -> list[Span]:
+    """Spans (from `start`) of the runs of tokens that the other line lacks."""
+    if other.isdisjoint(tokens):
+        return [Span(start, start + sum(map(len, tokens)), CHANGED)] if tokens else []
+    spans: list[Span] = []
+    pos = start
+    for token in tokens:
+        stop = pos + len(token)
+        if token not in other:
+            if spans and spans[-1].stop == pos:
+                spans[-1].stop = stop
+            else:
+                spans.append(Span(pos, stop, CHANGED))
+        pos = stop
+    return spans
+
+
+def changed_spans(
+    old: bytes, new: bytes, offsets: tuple[int, int] = (0, 0)
+) -> tuple[list[Span], list[Span]]:
+    """
+    Find the words changed between a removed line and the added line paired with it
+    (giving spans shifted by the lines' `offsets`). The common prefix and suffix are
+    found first (cut back to whole words), leaving only the middle of each line to
+    tokenise, then the tokens of the other line's middle are hashed into a set to mark
+    those it lacks. Unlike a full token alignment this is linear in the line length,
+    at the cost of not marking tokens which were only moved or repeated.
+    """
+    head, tail = common_affixes(old, new)
+    if head == tail == 0:
+        return [], []  # Rewritten rather than edited, so there's nothing to point out
+    if in_word(old, head - 1) and (in_word(old, head) or in_word(new, head)):
+        head = len(old[:head].rstrip(WORD_BYTES))
+    old_stop, new_stop = len(old) - tail, len(new) - tail
+    if in_word(old, old_stop) and (
+        in_word(old, old_stop - 1) or in_word(new, new_stop - 1)
+    ):
+        tail = len(old[old_stop:].lstrip(WORD_BYTES))
+        old_stop, new_stop = len(old) - tail, len(new) - tail
+    old_tokens = TOKEN.findall(old[head:old_stop])
+    new_tokens = TOKEN.findall(new[head:new_stop])
+    old_offset, new_offset = offsets
+    return (
+        token_spans(old_tokens, set(new_tokens), old_offset + head),
+        token_spans(new_tokens, set(old_tokens), new_offset + head),
+    )
+
+
+def styled_lines(lines: bytes, spans: list[Span], restore: str) -> bytes:
+    if not spans:
+        return lines
+    # Latin-1 maps each byte to one character, so span offsets index bytes and the text
+    # round-trips exactly whatever its encoding
+    text = SpannedText(line=lines.decode("latin-1"), spans=spans)
+    return text.styled(restore=restore).encode("latin-1")
+
+
+def refine_block(match: re.Match) -> bytes:
+    """
+    Pair a run's removed and added lines in order, and style each side of the run as
+    one `SpannedText` holding the changed spans of all its lines.
+    """
+    block = match[0]
+    if not (added_start := block.find(b"\n+") + 1):
+        return block
+    old_lines, new_lines = block[:added_start], block[added_start:]
+    removed, added = old_lines.split(b"\n")[:-1], new_lines.split(b"\n")[:-1]
+    if len(removed) != len(added) or len(removed) > MAX_BLOCK_LINES:
+        return block  # Only runs that pair up line for line are refined
+    old_spans: list[Span] = []
+    new_spans: list[Span] = []
+    old_pos = new_pos = 1  # Skipping each line's origin character
+    for old, new in zip(removed, added):
+        if max(len(old), len(new)) <= MAX_LINE_LENGTH:
+            spans = changed_spans(old[1:], new[1:], (old_pos, new_pos))
+            old_spans += spans[0]
+            new_spans += spans[1]
+        old_pos += len(old) + 1
+        new_pos += len(new) + 1
+    return styled_lines(old_lines, old_spans, RED) + styled_lines(
+        new_lines, new_spans, GREEN
+    )
+
+
+def highlight_words(body: bytes) -> bytes:
+    """
+    Style the changed words within each run of removed lines replaced by as many added
+    lines (paired in order), as git's `diff-highlight` does. Runs and lines over the
+    `MAX_BLOCK_LINES` and `MAX_LINE_LENGTH` caps are left to whole-line styling, so
+    the cost per line is bounded.
+    """
+    return CHANGE_BLOCK.sub(refine_block, body)
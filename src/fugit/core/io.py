@@ -1,13 +1,97 @@
 from __future__ import annotations
 
+import subprocess
+import sys
+from collections import deque
 from collections.abc import Iterable
 from functools import cache
 from types import TracebackType
+from typing import BinaryIO
 
+from . import profiling
 from .error_handlers import SuppressBrokenPipeError
 from .paging import SystemPager, TerminalDimensions
 
-__all__ = ("PagerContext", "FugitConsole", "fugit_console")
+__all__ = (
+    "stdout_buffer",
+    "OutputStream",
+    "PagerContext",
+    "FugitConsole",
+    "fugit_console",
+)
+
+
+def stdout_buffer() -> BinaryIO:
+    """The byte stream under stdout, flushing any text already written to stdout."""
+    sys.stdout.flush()
+    return sys.stdout.buffer
+
+
+class OutputStream:
+    """
+    Write rendered output as it is submitted. Output goes straight to stdout unless
+    paging is enabled, in which case it is held back only until it overflows the
+    terminal, at which point a pager process is started and everything (the held
+    output and all that follows) is piped into it. At most one terminal's worth of
+    output is ever held. Output is bytes throughout, written to the byte stream under
+    stdout or to the pager's stdin pipe, so it is never re-encoded on the way out.
+    """
+
+    _console: FugitConsole
+    pager: SystemPager
+    held: list[bytes]
+    process: subprocess.Popen | None
+    sink: BinaryIO | None
+
+    def __init__(self, console: FugitConsole, pager: SystemPager, enabled: bool):
+        self._console = console
+        self.pager = pager
+        self.held = []
+        self.process = None
+        self.pager_cmd = pager.command() if enabled else None
+        self.sink = None if self.pager_cmd else stdout_buffer()
+
+    def write(self, segments: Iterable[bytes]) -> None:
+        if self.sink is None:
+            self.held.extend(segments)
+            if self._console.overflows_terminal():
+                self.process = self.pager.spawn(self.pager_cmd)
+                self.sink = self.process.stdin
+                self._emit(self.held)
+                del self.held[:]
+        else:
+            self._emit(segments)
+
+    def _emit(self, segments: Iterable[bytes]) -> None:
+        content = self._console._render_buffer(segments)
+        if self.process is None:
+            with SuppressBrokenPipeError(), profiling.profiler.phase("page"):
+                self.sink.write(content)
+        else:
+            try:
+                with profiling.profiler.phase("page"):
+                    self.sink.write(content)
+            except BrokenPipeError:
+                raise SystemExit(0)  # The pager was quit before the end of the output
+
+    def close(self) -> None:
+        if self.process is None:
+            with SuppressBrokenPipeError(), profiling.profiler.phase("page"):
+                stdout = stdout_buffer()
+                stdout.write(self._console._render_buffer(self.held))
+                stdout.flush()
+            del self.held[:]
+        else:
+            try:
+                self.sink.close()
+            except (BrokenPipeError, OSError):
+                pass
+            while True:
+                try:
+                    self.process.wait()
+                    break
+                except KeyboardInterrupt:
+                    pass  # Leave the pager in control of the terminal until it exits
 
 
 class PagerContext:
@@ -22,7 +106,17 @@ class PagerContext:
         self.styles = styles
         self.enabled = enabled
 
-    def __enter__(self) -> PagerContext:
+    def __enter__(self) -> FugitConsole:
+        self._console.file_count = 0
+        self._console.line_count = self._console._submitted_lines = 0
+        self._console._held_header = b""
+        if self._console.file_limit < 0:
+            self._console.tail = deque(maxlen=-self._console.file_limit)
+        self._console.stream = OutputStream(
+            self._console,
+            pager=self.pager,
+            enabled=self.enabled,
+        )
         return self._console
 
     def __exit__(
@@ -30,20 +124,16 @@ class PagerContext:
         exc_type: type[BaseException] | None,
         exc_val: BaseException | None,
         exc_tb: TracebackType | None,
-    ) -> None:
-        if exc_type is None:
-            buffer: list[str] = self._console.printer_queue[:]
-            del self._console.printer_queue[:]
-            segments: Iterable[str] = buffer
-            with SuppressBrokenPipeError():
-                content = self._console._render_buffer(segments)
-                last_newline = content.rfind("\n", 1)
-                content = content[:last_newline] + content[last_newline + 1 :]
-                if self.enabled and self._console.overflows_terminal():
-                    self.pager.show(content)
-                else:
-                    print(content)
-        return
+    ) -> bool | None:
+        try:
+            if exc_type is None or exc_type is SystemExit:
+                self._console.flush_tail()
+        finally:
+            stream, self._console.stream = self._console.stream, None
+            self._console.tail = None
+            stream.close()
+        # A zero exit code signals output ended early (file limit reached or pager quit)
+        return exc_type is SystemExit and exc_val.code == 0
 
 
 @cache
@@ -53,7 +143,11 @@ class FugitConsole:
     file_limit: int
     file_count: int = 0
     line_count: int = 0
-    printer_queue: list[str] = []
+    stream: OutputStream | None = None
+    tail: deque[tuple[int, bytes]] | None = None
+    terminal: TerminalDimensions | None = None
+    _submitted_lines: int = 0
+    _held_header: bytes = b""
 
     def __init__(
         self,
@@ -70,7 +164,8 @@ class FugitConsole:
         self.file_limit: int = file_limit
 
     def size(self) -> TerminalDimensions:
-        return TerminalDimensions()
+        """The fixed `terminal` dimensions if set, else those of the current terminal."""
+        return self.terminal or TerminalDimensions()
 
     def overflows_terminal(self) -> bool:
         terminal_height = self.size().height
@@ -81,30 +176,56 @@ class FugitConsole:
         active = self.use_pager
         return PagerContext(self, styles=styles, enabled=active)
 
-    def submit(self, *output: str) -> None:
+    def submit(self, *output: bytes) -> None:
+        """
+        Send output to the stream opened by the pager context, but don't style at all if
+        console was set to plain (so no bold, italics, etc. either), and avoid broken
+        pipe errors when piping to `head` etc.
+        """
+        if self.file_limit > 0 and self.file_count == self.file_limit:
+            raise SystemExit(0)
+        if self.quiet:
+            return
+        if self.tail is not None:
+            # Hold only the last files in a ring buffer, written out by `flush_tail`
+            self.tail.append(
+                (
+                    self.line_count - self._submitted_lines,
+                    self._held_header + b"".join(output),
+                )
+            )
+            self._submitted_lines = self.line_count
+            self._held_header = b""
+            return
+        self.stream.write(output)
+
+    def submit_header(self, header: bytes) -> None:
         """
-        Report output through the rich console, but don't style at all if console was set to
-        plain (so no bold, italics, etc. either), and avoid broken pipe errors when
-        piping to `head` etc.
+        Send a header (e.g. a commit's) which heads the files after it but isn't a file
+        itself. In tail mode it takes no place in the ring buffer: it is held, and its
+        lines counted, with the next file, so it is only written if that file is.
         """
-        if self.file_limit != 0:
-            if self.file_count == self.file_limit:
-                raise SystemExit(0)
-            if self.file_limit < 0:
-                raise NotImplementedError("Tail not implemented yet")
-        self.printer_queue.extend(output)
-
-    def print_all(self) -> None:
-        """Print the queue"""
-        with SuppressBrokenPipeError():
-            self._render_buffer(*self.printer_queue)
+        if self.tail is None:
+            self.submit(header)
+        elif not self.quiet:
+            self._held_header += header
+
+    def flush_tail(self) -> None:
+        """Write out the files held in tail mode, counting only their lines."""
+        if self.tail is None:
+            return
+        held, self.tail = self.tail, None
+        self.line_count = self._submitted_lines = 0
+        for line_count, rendered in held:
+            self.line_count += line_count
+            self.stream.write([rendered])
 
     def _render_buffer(
         self,
-        feed: list[str],
-        sep: str = "",
-    ) -> str:
-        """Concatenate the buffer into a single string to send to the pager."""
+        feed: Iterable[bytes],
+        sep: bytes = b"",
+    ) -> bytes:
+        """Concatenate the buffer into a single bytestring to send to the output."""
         return sep.join(feed)
 
 
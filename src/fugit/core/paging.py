@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import os
+import shutil
+import subprocess
+import sys
 from os import get_terminal_size
 
 __all__ = ("TerminalDimensions", "SystemPager")
@@ -9,9 +13,10 @@ class TerminalDimensions:
     height: int
     width: int
 
-    def __init__(self):
+    def __init__(self, size: os.terminal_size | None = None):
+        """Measure the terminal, unless given the `size` of one (e.g. a client's)."""
         try:
-            size = get_terminal_size()
+            size = size or get_terminal_size()
             self.height = size.lines
             self.width = size.columns
         except OSError:
@@ -24,3 +29,18 @@ class SystemPager:
     def show(self, content: str):
         assert isinstance(content, str)
         return __import__("pydoc").pager(content)
+
+    def command(self) -> str | None:
+        """
+        The shell command to page with, following `pydoc.getpager`: only page when
+        attached to a terminal, preferring `$MANPAGER`/`$PAGER` and then `less`.
+        """
+        if not (sys.stdin.isatty() and sys.stdout.isatty()):
+            return None
+        if cmd := os.environ.get("MANPAGER") or os.environ.get("PAGER"):
+            return cmd
+        return "less -R" if shutil.which("less") else None
+
+    def spawn(self, cmd: str) -> subprocess.Popen:
+        """Start a long-lived pager process to pipe output bytes into via its stdin."""
+        return subprocess.Popen(cmd, shell=True, stdin=subprocess.PIPE)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import sys
+from collections.abc import Iterable, Iterator
+from contextlib import AbstractContextManager, nullcontext
+from time import perf_counter, process_time
+from types import TracebackType
+
+import msgspec
+from msgspec import Struct
+
+__all__ = ("PhaseStats", "ProfileReport", "Profiler", "profiler")
+
+UNATTRIBUTED = "other"
+"""Time spent outside of any phase is charged to this one."""
+
+
+class PhaseStats(Struct):
+    wall: float = 0.0
+    cpu: float = 0.0
+    peak_memory: int | None = None
+
+
+class ProfileReport(Struct):
+    phases: dict[str, PhaseStats]
+    counters: dict[str, int]
+    wall: float
+    cpu: float
+
+    def table(self) -> str:
+        """Format the report as a plain text table, phases in order of first entry."""
+        memory = any(stats.peak_memory is not None for stats in self.phases.values())
+        head = f"{'phase':<12}{'wall (s)':>10}{'cpu (s)':>10}{'%':>7}"
+        lines = [head + (f"{'peak (MiB)':>12}" if memory else "")]
+        for name, stats in self.phases.items():
+            share = 100 * stats.wall / self.wall if self.wall else 0.0
+            line = f"{name:<12}{stats.wall:>10.3f}{stats.cpu:>10.3f}{share:>7.1f}"
+            if stats.peak_memory is not None:
+                line += f"{stats.peak_memory / 2**20:>12.1f}"
+            lines.append(line)
+        lines.append(f"{'total':<12}{self.wall:>10.3f}{self.cpu:>10.3f}")
+        lines.append(
+            "  ".join(f"{name}: {count}" for name, count in self.counters.items())
+        )
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path: str = "") -> None:
+        """Write the report as JSON to a path if given, otherwise as a table to stderr."""
+        if json_path:
+            with open(json_path, "wb") as json_file:
+                json_file.write(msgspec.json.encode(self))
+        else:
+            sys.stderr.write(self.table())
+
+
+class Phase(AbstractContextManager):
+    """Reusable context manager marking a phase as running (nested ones take over)."""
+
+    def __init__(self, profiler: Profiler, stats: PhaseStats):
+        self.profiler = profiler
+        self.stats = stats
+
+    def __enter__(self) -> None:
+        self.profiler._switch()
+        self.profiler._stack.append(self.stats)
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.profiler._switch()
+        self.profiler._stack.pop()
+
+
+class Profiler:
+    """
+    Attribute wall time, CPU time and (optionally) the tracemalloc peak to pipeline
+    phases, and tally counters. The pipeline is a chain of generators, so phases nest
+    (e.g. pulling a converted patch runs the diff): time is only ever charged to the
+    innermost running phase, by reading the clocks each time a phase starts or stops.
+    When disabled every hook is a no-op, so the instrumented code costs next to nothing.
+    """
+
+    enabled: bool
+    trace_memory: bool
+    stats: dict[str, PhaseStats]
+    counters: dict[str, int]
+
+    def __init__(self, enabled: bool = False, trace_memory: bool = False):
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.stats = {}
+        self.counters = {}
+        self._phases: dict[str, Phase] = {}
+        self._stack = [self.phase(UNATTRIBUTED).stats] if enabled else []
+        self._null = nullcontext()
+
+    def start(self) -> None:
+        if self.trace_memory:
+            import tracemalloc  # Not loaded unless needed, as it pulls in pickle
+
+            tracemalloc.start()
+        self._start_wall = self._wall = perf_counter()
+        self._start_cpu = self._cpu = process_time()
+
+    def stop(self) -> ProfileReport:
+        self._switch()
+        if self.trace_memory:
+            import tracemalloc
+
+            tracemalloc.stop()
+        return ProfileReport(
+            phases=self.stats,
+            counters=self.counters,
+            wall=self._wall - self._start_wall,
+            cpu=self._cpu - self._start_cpu,
+        )
+
+    def _switch(self) -> None:
+        """Charge the time since the last switch to the phase that was running."""
+        wall, cpu = perf_counter(), process_time()
+        stats = self._stack[-1]
+        stats.wall += wall - self._wall
+        stats.cpu += cpu - self._cpu
+        if self.trace_memory:
+            import tracemalloc
+
+            _, peak = tracemalloc.get_traced_memory()
+            stats.peak_memory = max(stats.peak_memory or 0, peak)
+            tracemalloc.reset_peak()
+        self._wall, self._cpu = wall, cpu
+
+    def phase(self, name: str) -> AbstractContextManager:
+        if not self.enabled:
+            return self._null
+        if (phase := self._phases.get(name)) is None:
+            stats = self.stats[name] = PhaseStats()
+            phase = self._phases[name] = Phase(self, stats)
+        return phase
+
+    def iterate(self, name: str, items: Iterable) -> Iterable:
+        """Run the production of each item (i.e. each `next` call) as the named phase."""
+        if not self.enabled:
+            return items
+        return self._iterate(self.phase(name), iter(items))
+
+    @staticmethod
+    def _iterate(phase: Phase, items: Iterator) -> Iterator:
+        while True:
+            with phase:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, **counts: int) -> None:
+        if not self.enabled:
+            return
+        for name, count in counts.items():
+            self.counters[name] = self.counters.get(name, 0) + count
+
+
+profiler = Profiler()
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
 from enum import Enum
+from operator import attrgetter
 
 from msgspec import Struct
 
+from .escaping import esc_pair
+
 __all__ = ("Style", "Span", "SpannedText")
 
 
@@ -14,9 +17,10 @@ class Style(Enum):
     w = "white"
     W = "bold white"
     Y_ = "bold yellow underline"
+    v = "reverse"
 
 
-class Span(Struct):
+class Span(Struct, gc=False):
     start: int
     stop: int
     style: Style
@@ -26,3 +30,20 @@ class SpannedText(Struct):
     line: str
     style: Style = Style.w
     spans: list[Span] = []
+
+    def styled(self, restore: str = "") -> str:
+        """
+        Escape each span with its style, then `restore` the surrounding style after it.
+        Spans overlapping an earlier one are skipped.
+        """
+        line = self.line
+        segments = []
+        pos = 0
+        for span in sorted(self.spans, key=attrgetter("start")):
+            if (start := span.start) < pos:
+                continue
+            on, off = esc_pair(span.style.value)
+            segments += (line[pos:start], on, line[start : span.stop], off, restore)
+            pos = span.stop
+        segments.append(line[pos:])
+        return "".join(segments)
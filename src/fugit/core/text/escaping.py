@@ -1,11 +1,29 @@
+from functools import cache
+
+from .palette import RESET
+
 __all__ = ("escape", "esc_pair")
 
+SGR_CODES = {
+    "bold": 1,
+    "underline": 4,
+    "reverse": 7,
+    "red": 31,
+    "green": 32,
+    "yellow": 33,
+    "white": 37,
+    "blue": 94,
+}
+
 
-def escape(desc: str, on: bool) -> tuple[str, str]:
+def escape(desc: str, on: bool) -> str:
     """Return the ANSI code to escape (on/off) the described effect."""
-    return ""
+    if not on:
+        return RESET
+    return "".join(f"\033[{SGR_CODES[word]}m" for word in desc.split())
 
 
+@cache
 def esc_pair(desc: str) -> tuple[str, str]:
     """Return the ANSI code to escape (on and off) the described effect."""
     return tuple(escape(desc, on=toggle) for toggle in (True, False))
@@ -1,7 +1,8 @@
-__all__ = ("BOLD", "BOLD_YELLOW_US", "RED", "GREEN", "BLUE", "WHITE", "RESET")
+__all__ = ("BOLD", "BOLD_YELLOW_US", "YELLOW", "RED", "GREEN", "BLUE", "WHITE", "RESET")
 
 BOLD = "\033[1m"
 BOLD_YELLOW_US = "\033[1m\033[4m\033[33m"
+YELLOW = f"\033[{33}m"
 RED = f"\033[{31}m"
 GREEN = f"\033[{32}m"
 BLUE = f"\033[{94}m"
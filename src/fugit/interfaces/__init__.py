@@ -1,3 +1,13 @@
-from .diffing import DiffConfig, configure_global_console
+from .diffing import (
+    DiffConfig,
+    OutputFormat,
+    configure_global_console,
+    profiling_requested,
+)
 
-__all__ = ("DiffConfig", "configure_global_console")
+__all__ = (
+    "DiffConfig",
+    "OutputFormat",
+    "configure_global_console",
+    "profiling_requested",
+)
@@ -1,11 +1,22 @@
-from typing import Annotated
+import re
+from typing import Annotated, Literal
 
 from msgspec import Meta, Struct
 
 from ..core import io
+from ..core.errors import FugitUserError
 from ..core.io import FugitConsole
 
-__all__ = ("DebugConfig", "DisplayConfig", "DiffConfig", "configure_global_console")
+__all__ = (
+    "DebugConfig",
+    "DisplayConfig",
+    "DiffConfig",
+    "OutputFormat",
+    "configure_global_console",
+    "profiling_requested",
+)
+
+OutputFormat = Literal["text", "stat", "numstat", "cluster", "jsonl", "msgpack"]
 
 
 def desc(typ, description: str):
@@ -15,20 +26,71 @@ def desc(typ, description: str):
 
 class DebugConfig(Struct):
     debug: desc(bool, "Run debug diagnostics") = False
+    profile: desc(bool, "Time each phase and count files, hunks, lines and bytes") = (
+        False
+    )
+    profile_memory: desc(bool, "Also trace each phase's peak memory (slower)") = False
+    profile_json: desc(str, "Write the profile as JSON to this path, not stderr") = ""
 
 
 class DisplayConfig(DebugConfig):
     quiet: desc(bool, "Print nothing at all") = False
     plain: desc(bool, "Don't apply any kind of text styling") = False
+    word_diff: desc(
+        bool, "Highlight the changed words of paired removed and added lines"
+    ) = False
     no_pager: desc(bool, "Don't send output to the system pager") = False
     file_limit: desc(int, "Stop after a certain number of files match the filters") = 0
+    jobs: desc(int, "Render file patches in this many worker processes") = 1
+    output_format: desc(
+        OutputFormat,
+        "Output as text, stat, numstat, cluster (distinct hunks), jsonl or msgpack",
+    ) = "text"
 
 
 class RepoConfig(DisplayConfig):
     change_type: desc(list[str], "Filter diff hunk types") = []
+    grep: desc(list[str], "Keep only hunks whose changed lines match a regex") = []
+    pathspec: desc(
+        list[str], "Limit the diff to matching paths (or pass them after --)"
+    ) = []
     repo: desc(str, "The repo whose git diff is to be computed") = "."
     revision: desc(str, "The commit for comparison with the index") = "HEAD"
+    range: desc(str, "Diff each commit in a range (e.g. A..B) instead of the index") = (
+        ""
+    )
+    rename_threshold: desc(
+        int, "Detect renames of at least this similarity (1-100), as git -M"
+    ) = 0
+    rename_copy_threshold: desc(
+        int, "Detect copies of at least this similarity (1-100), as git -C"
+    ) = 0
+    rename_limit: desc(
+        int, "Skip inexact rename/copy detection beyond this many files on either side"
+    ) = 1000
+    large_file_bytes: desc(
+        int, "Summarise files over this many bytes instead of diffing them"
+    ) = 0
+    large_file_lines: desc(
+        int, "Summarise files over this many lines instead of diffing them"
+    ) = 0
     pygit2: desc(bool, "Use the pygit2 backend rather than GitPython") = False
+    skip_cache: desc(bool, "Don't read or write the on-disk diff cache") = False
+    max_cache_size: desc(int, "Maximum size of the on-disk diff cache in MiB") = 256
+
+    def __post_init__(self) -> None:
+        for pattern in self.grep:
+            try:
+                re.compile(pattern)
+            except re.error as exc:
+                raise FugitUserError(
+                    f"Invalid --grep pattern {pattern!r}: {exc}", code="invalid-config"
+                ) from None
+        if self.range and self.output_format in ("stat", "numstat"):
+            raise FugitUserError(
+                f"--range isn't supported with --output-format {self.output_format}",
+                code="invalid-config",
+            )
 
 
 class DiffConfig(RepoConfig):
@@ -47,3 +109,8 @@ def configure_global_console(config: DiffConfig) -> None:
         use_pager=not config.no_pager,
         file_limit=config.file_limit,
     )
+
+
+def profiling_requested(config: DebugConfig) -> bool:
+    """Whether any of the profiling flags was given."""
+    return config.profile or config.profile_memory or bool(config.profile_json)
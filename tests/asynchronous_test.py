@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from contextlib import aclosing
+
+from pytest import raises
+
+from fugit import adiff
+from fugit.core.diffing.asynchronous import aload_diff_infos
+from fugit.interfaces import DiffConfig
+
+
+async def collect_paths(**config) -> list[str]:
+    return [info.delta.new_file.path async for info in adiff(**config)]
+
+
+def test_adiff_yields_each_file(staged_repo):
+    async def both():
+        return await asyncio.gather(
+            collect_paths(repo=str(staged_repo)),
+            collect_paths(repo=str(staged_repo), pathspec=["src"], skip_cache=True),
+        )
+
+    assert asyncio.run(both()) == [
+        ["new.txt", "src/gone.py", "src/mod.py"],
+        ["src/gone.py", "src/mod.py"],
+    ]
+
+
+def test_concurrent_adiff_same_repo(staged_repo, isolated_cache):
+    async def many():
+        return await asyncio.gather(
+            *(collect_paths(repo=str(staged_repo)) for _ in range(8))
+        )
+
+    expected = ["new.txt", "src/gone.py", "src/mod.py"]
+    assert asyncio.run(many()) == [expected] * 8
+    assert [p.suffix for p in isolated_cache.iterdir()] == [".msgpack"]
+    assert asyncio.run(many()) == [expected] * 8  # Read back from the cache
+
+
+def test_adiff_range(history_repo):
+    paths = asyncio.run(collect_paths(repo=str(history_repo), range="HEAD~2..HEAD"))
+    assert paths == ["mod.py", "mod.py"]
+
+
+def test_adiff_limit_and_errors(staged_repo):
+    assert asyncio.run(collect_paths(repo=str(staged_repo), file_limit=-1)) == [
+        "src/mod.py"
+    ]
+    with raises(KeyError):
+        asyncio.run(collect_paths(repo=str(staged_repo), revision="nonexistent"))
+
+
+def test_stopping_early_ends_worker(staged_repo):
+    async def first() -> str:
+        config = DiffConfig(repo=str(staged_repo), skip_cache=True)
+        async with aclosing(aload_diff_infos(config, maxsize=1)) as diff_infos:
+            async for info in diff_infos:
+                return info.delta.new_file.path
+
+    assert asyncio.run(first()) == "new.txt"
+    workers = [t for t in threading.enumerate() if t.name.startswith("fugit-adiff")]
+    for worker in workers:
+        worker.join(timeout=5)
+        assert not worker.is_alive()
@@ -0,0 +1,116 @@
+import os
+
+from pygit2 import Repository
+
+from fugit.core.diffing.cache import DiffCache, MemoryDiffCache
+from fugit.core.diffing.logic import load_diff_infos
+from fugit.interfaces import DiffConfig
+from tests.io_test import run
+
+
+def test_repeat_diff_read_from_cache(staged_repo, isolated_cache):
+    config = DiffConfig(repo=str(staged_repo))
+    repo = Repository(config.repo)
+    fresh = list(load_diff_infos(repo, config))
+    [entry] = isolated_cache.glob("*.msgpack")
+    cached = list(load_diff_infos(repo, config))
+    assert [i.text for i in cached] == [i.text for i in fresh]
+    assert "hunks" not in cached[-1].__dict__
+    # The hunks were never decoded, so are parsed back from the patch text
+    assert [h.header for h in cached[-1].hunks] == [h.header for h in fresh[-1].hunks]
+    assert [line.content for line in cached[-1].hunks[0].lines] == [
+        line.content for line in fresh[-1].hunks[0].lines
+    ]
+
+
+def test_decoded_hunks_cached(staged_repo, isolated_cache):
+    config = DiffConfig(repo=str(staged_repo))
+    repo = Repository(config.repo)
+    fresh = [info.hunks for info in load_diff_infos(repo, config)]
+    assert [info.hunks for info in load_diff_infos(repo, config)] == fresh
+
+
+def test_memory_cache_holds_no_patches(staged_repo):
+    config = DiffConfig(repo=str(staged_repo))
+    repo = Repository(config.repo)
+    cache = MemoryDiffCache(limit=2**20)
+    fresh = [info.hunks for info in load_diff_infos(repo, config, cache=cache)]
+    [records] = cache.entries.values()
+    assert all(isinstance(hunks, bytes) for _, _, hunks in records)
+    assert cache.sizes[next(iter(cache.entries))] == sum(
+        len(data) + len(hunks) for _, data, hunks in records
+    )
+    cached = list(load_diff_infos(repo, config, cache=cache))
+    assert [info.hunks for info in cached] == fresh
+    assert "hunks" not in next(load_diff_infos(repo, config, cache=cache)).__dict__
+
+
+def test_records_same_whether_cached(staged_repo, isolated_cache, capsysbinary):
+    def records(**config) -> bytes:
+        run(repo=str(staged_repo), output_format="jsonl", **config)
+        return capsysbinary.readouterr().out
+
+    expected = records(skip_cache=True)
+    assert b'"content_offset":-1' in expected  # Context lines have no offset
+    run(repo=str(staged_repo))  # A text run caches no hunks
+    capsysbinary.readouterr()
+    assert records() == expected  # Not parsed back from the text run's entry
+    assert records() == expected  # Read from the structured entry
+    assert len(list(isolated_cache.glob("*.msgpack"))) == 2
+
+
+def test_index_change_misses_cache(staged_repo, isolated_cache):
+    config = DiffConfig(repo=str(staged_repo))
+    repo = Repository(config.repo)
+    list(load_diff_infos(repo, config))
+    (staged_repo / "extra.txt").write_text("more\n")
+    repo.index.add("extra.txt")
+    repo.index.write()
+    assert len(list(load_diff_infos(repo, config))) == 4
+    assert len(list(isolated_cache.glob("*.msgpack"))) == 2
+
+
+def test_incomplete_diff_not_cached(staged_repo, isolated_cache):
+    config = DiffConfig(repo=str(staged_repo))
+    diff_infos = load_diff_infos(Repository(config.repo), config)
+    next(diff_infos)
+    diff_infos.close()
+    assert list(isolated_cache.iterdir()) == []
+
+
+def test_skip_cache(staged_repo, isolated_cache):
+    config = DiffConfig(repo=str(staged_repo), skip_cache=True)
+    list(load_diff_infos(Repository(config.repo), config))
+    assert not isolated_cache.exists()
+
+
+def test_unwritable_cache_dir(staged_repo, tmp_path, monkeypatch):
+    config = DiffConfig(repo=str(staged_repo))
+    repo = Repository(config.repo)
+    expected = [info.text for info in load_diff_infos(repo, config)]
+    (tmp_path / "file").write_text("")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "file"))  # Can't be a dir
+    assert [info.text for info in load_diff_infos(repo, config)] == expected
+
+
+def test_corrupt_entry_rediffed(staged_repo, isolated_cache):
+    config = DiffConfig(repo=str(staged_repo))
+    repo = Repository(config.repo)
+    expected = [info.text for info in load_diff_infos(repo, config)]
+    [entry] = isolated_cache.glob("*.msgpack")
+    data = entry.read_bytes()
+    entry.write_bytes(data[: len(data) // 2])  # Truncated partway through a record
+    assert [info.text for info in load_diff_infos(repo, config)] == expected
+    assert not entry.exists()
+    assert [info.text for info in load_diff_infos(repo, config)] == expected
+    assert entry.read_bytes() == data
+
+
+def test_lru_eviction(tmp_path):
+    cache = DiffCache(tmp_path, limit=10)
+    for name, age in [("old", 1), ("new", 2)]:
+        entry = cache.path(name)
+        entry.write_bytes(b"x" * 8)
+        os.utime(entry, (age, age))
+    cache.evict()
+    assert [p.stem for p in tmp_path.iterdir()] == ["new"]
@@ -0,0 +1,48 @@
+import subprocess
+import sys
+
+from pytest import raises
+
+from fugit.cli.run import configure
+from fugit.core.errors import FugitMisconfigurationExit
+
+
+def test_cli_import_defers_heavy_modules():
+    """Parsing arguments (or printing help) shouldn't load pygit2 or the debugger."""
+    code = (
+        "import sys; from fugit.cli.run import configure; configure(argv=['-q'])\n"
+        "print(*sorted({'pygit2', 'pysnooper', 'multiprocessing'} & set(sys.modules)))"
+    )
+    loaded = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert loaded.stdout.strip() == ""
+
+
+def test_no_daemon_client_without_socket(staged_repo, tmp_path):
+    """Without a daemon socket to hand the diff to, its client isn't imported."""
+    code = (
+        "import sys; from fugit.cli.run import run_cli\n"
+        f"sys.argv = ['fugit', '--repo', {str(staged_repo)!r}, '-q']; run_cli()\n"
+        "print(*sorted({'fugit.core.daemon', 'socketserver'} & set(sys.modules)))"
+    )
+    env = {"PATH": "", "XDG_RUNTIME_DIR": str(tmp_path)}
+    loaded = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    assert loaded.stdout.strip() == ""
+
+
+def test_repeat_configure_defaults_not_shared():
+    first, second = configure(argv=["-g", "x"]), configure(argv=[])
+    assert first.grep == ["x"] and second.grep == []
+
+
+def test_output_format_choices():
+    assert configure(argv=["-o", "jsonl"]).output_format == "jsonl"
+    with raises(FugitMisconfigurationExit):
+        configure(argv=["-o", "json"])
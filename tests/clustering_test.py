@@ -0,0 +1,82 @@
+from functools import partial
+
+from pygit2 import Repository
+
+from fugit.core.diffing import load_diff, logic
+from fugit.core.diffing.clustering import HunkIndex, hunk_digest
+from fugit.core.diffing.logic import iter_diff_infos, process_clusters
+from fugit.core.diffing.pygit2 import DeltaStatus, DiffInfoPG2
+from fugit.core.diffing.pygit2.structures import DiffDelta, DiffFile
+from fugit.core.io import FugitConsole
+from fugit.interfaces import DiffConfig, configure_global_console
+
+
+def test_identical_hunks_clustered(formatted_repo):
+    repo_diff = Repository(str(formatted_repo)).diff("HEAD", cached=True)
+    index = HunkIndex().add_all(iter_diff_infos(repo_diff))
+    common, unique = index.ranked()
+    assert index.hunk_count == 4
+    assert (common.count, common.file_count) == (3, 3)
+    assert common.paths == ["pkg/m0.py", "pkg/m1.py", "pkg/m2.py"]
+    assert "+x = [1, 2]\n" in common.sample
+    assert unique.paths == ["pkg/m3.py"]
+
+
+def test_digest_ignores_context_and_whitespace():
+    a = "@@ -1,2 +1,2 @@\n a\n-x=1\n+x = 1\n"
+    b = "@@ -9,2 +9,2 @@ def f():\n b\n-x=1\n+x  =  1\n"
+    assert hunk_digest(a) == hunk_digest(b)
+    assert hunk_digest(a) != hunk_digest(a.replace("+x = 1", "+x = 2"))
+
+
+def removal(path: str, line: str) -> DiffInfoPG2:
+    files = DiffFile(path), DiffFile(path)
+    delta = DiffDelta(*files, status=DeltaStatus.MODIFIED)
+    return DiffInfoPG2(delta, f"@@ -1 +0,0 @@\n-{line}\n".encode())
+
+
+def test_samples_kept_for_most_frequent_changes():
+    index = HunkIndex(max_samples=1)
+    index.add_all(removal(path, line) for path, line in zip("abcde", "xyyxx"))
+    [frequent] = index.ranked()
+    assert (frequent.count, frequent.sample) == (3, "@@ -1 +0,0 @@\n-x\n")
+    [rare] = index.unsampled()
+    assert (rare.count, rare.sample) == (2, "")
+
+
+def test_unsampled_changes_counted_not_shown(monkeypatch, capsys):
+    monkeypatch.setattr(logic, "HunkIndex", partial(HunkIndex, max_samples=2))
+    config = DiffConfig(output_format="cluster", plain=True)
+    infos = (removal(path, line) for path, line in zip("abcdefg", "xxxyyzw"))
+    with FugitConsole(plain=True, use_pager=False).pager() as console:
+        process_clusters(console, infos, config)
+    assert capsys.readouterr().out.splitlines() == [
+        "3x in 3 files: a, b, c",
+        "@@ -1 +0,0 @@",
+        "-x",
+        "2x in 2 files: d, e",
+        "@@ -1 +0,0 @@",
+        "-y",
+        "2 more distinct changes (2 hunks) not shown",
+    ]
+
+
+def test_range_clustered(history_repo, capsys):
+    config = DiffConfig(
+        repo=str(history_repo),
+        range="HEAD~2..HEAD",
+        output_format="cluster",
+        plain=True,
+    )
+    configure_global_console(config)
+    load_diff(config)
+    assert capsys.readouterr().out.splitlines() == [
+        "1x in 1 file: mod.py",
+        "@@ -1 +1 @@",
+        "-x = 1",
+        "+x=1",
+        "1x in 1 file: mod.py",
+        "@@ -1 +1 @@",
+        "-x=1",
+        "+x = 1",
+    ]
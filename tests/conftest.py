@@ -0,0 +1,89 @@
+from pathlib import Path
+
+from pygit2 import Repository, Signature, init_repository
+from pytest import fixture
+
+from fugit.core import io
+
+
+def commit_all(repo: Repository, message: str) -> None:
+    """Stage everything in the working tree and commit it on HEAD."""
+    repo.index.add_all()
+    repo.index.write()
+    tree = repo.index.write_tree()
+    sig = Signature("fugit", "fugit@example.com")
+    parents = [] if repo.head_is_unborn else [repo.head.target]
+    repo.create_commit("HEAD", sig, sig, message, tree, parents)
+
+
+def write_files(root: Path, files: dict[str, str]) -> None:
+    for name, content in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+@fixture
+def staged_repo(tmp_path: Path) -> Path:
+    """A repo with a modification, an addition and a deletion staged against HEAD."""
+    repo = init_repository(tmp_path)
+    write_files(
+        tmp_path,
+        {
+            "src/mod.py": "a = 1\nb = 2\nc = 3\n",
+            "src/gone.py": "x = 0\n",
+            "docs/index.md": "# Docs\n",
+        },
+    )
+    commit_all(repo, "Initial commit")
+    write_files(tmp_path, {"src/mod.py": "a = 1\nb = 20\nc = 3\n", "new.txt": "hi\n"})
+    (tmp_path / "src" / "gone.py").unlink()
+    repo.index.add_all()
+    repo.index.write()
+    return tmp_path
+
+
+@fixture(autouse=True)
+def global_console(monkeypatch) -> None:
+    """Restore the global console after tests which configure it (e.g. to tail)."""
+    monkeypatch.setattr(io, "fugit_console", io.fugit_console)
+
+
+@fixture(autouse=True)
+def isolated_cache(tmp_path_factory, monkeypatch) -> Path:
+    """Keep the on-disk diff cache out of the user's home directory."""
+    cache_home = tmp_path_factory.mktemp("cache")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache_home))
+    return cache_home / "fugit"
+
+
+@fixture
+def history_repo(tmp_path: Path) -> Path:
+    """A linear history where a formatting change is reverted and then re-applied."""
+    repo = init_repository(tmp_path)
+    for message, content in [
+        ("Initial commit", "x=1\n"),
+        ("Format", "x = 1\n"),
+        ("Revert", "x=1\n"),
+        ("Reformat", "x = 1\n"),
+    ]:
+        write_files(tmp_path, {"mod.py": content})
+        commit_all(repo, message)
+    return tmp_path
+
+
+@fixture
+def formatted_repo(tmp_path: Path) -> Path:
+    """A repo where the same formatter change is staged in several files, plus one other."""
+    repo = init_repository(tmp_path)
+    files = {f"pkg/m{i}.py": f"import os\nx=[1,2]\ny = {i}\n" for i in range(4)}
+    write_files(tmp_path, files)
+    commit_all(repo, "Initial commit")
+    write_files(
+        tmp_path,
+        {name: text.replace("x=[1,2]", "x = [1, 2]") for name, text in files.items()},
+    )
+    write_files(tmp_path, {"pkg/m3.py": "import sys\nx = [1, 2]\ny = 3\n"})
+    repo.index.add_all()
+    repo.index.write()
+    return tmp_path
@@ -0,0 +1,107 @@
+import os
+import socket
+import time
+from threading import Thread
+
+from pygit2 import Repository
+from pytest import fixture
+
+from fugit.core import daemon
+from fugit.core.daemon import DiffServer, request_diff, socket_path
+from fugit.interfaces import DiffConfig
+from tests.io_test import run
+
+
+@fixture
+def server(tmp_path_factory):
+    """A daemon serving on a temporary socket from a background thread."""
+    path = str(tmp_path_factory.mktemp("daemon") / "fugit.sock")
+    with DiffServer(path) as server:
+        thread = Thread(target=server.serve_forever)
+        thread.start()
+        yield server
+        server.shutdown()
+        thread.join()
+
+
+def test_daemon_output_matches_in_process(staged_repo, server, capsys):
+    run(repo=str(staged_repo), plain=True)
+    expected = capsys.readouterr().out
+    config = DiffConfig(repo=str(staged_repo), plain=True)
+    for _ in range(2):
+        output = request_diff(config, path=server.server_address)
+        assert b"".join(output).decode() == expected
+    assert len(server.outputs) == 1 and len(server.repositories) == 1
+
+
+def test_daemon_sees_index_change(staged_repo, server):
+    config = DiffConfig(repo=str(staged_repo), plain=True)
+    before = b"".join(request_diff(config, path=server.server_address))
+    (staged_repo / "extra.txt").write_text("more\n")
+    repo = Repository(str(staged_repo))
+    repo.index.add("extra.txt")
+    repo.index.write()
+    after = b"".join(request_diff(config, path=server.server_address))
+    assert b"A: extra.txt\n" in after and b"extra.txt" not in before
+
+
+def test_daemon_error_falls_back(staged_repo, server):
+    config = DiffConfig(repo=str(staged_repo), revision="nonexistent")
+    assert request_diff(config, path=server.server_address) is None
+
+
+def test_no_daemon_falls_back(staged_repo, tmp_path):
+    config = DiffConfig(repo=str(staged_repo))
+    path = str(tmp_path / "missing.sock")
+    assert request_diff(config, path=path) is None
+    with socket.socket(socket.AF_UNIX) as stale:
+        stale.bind(path)  # Bound but never listening, as if left by a killed daemon
+    os.chmod(path, 0o600)
+    assert request_diff(config, path=path) is None
+
+
+def test_unowned_socket_not_used(staged_repo, server):
+    config = DiffConfig(repo=str(staged_repo))
+    path = server.server_address
+    assert b"".join(request_diff(config, path=path))
+    os.chmod(path, 0o666)  # As another user's daemon might leave it
+    assert request_diff(config, path=path) is None
+
+
+def test_no_runtime_dir_runs_in_process(monkeypatch):
+    monkeypatch.delenv("FUGIT_SOCKET", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    assert socket_path() is None
+    assert request_diff(DiffConfig()) is None
+
+
+def test_hung_daemon_times_out(staged_repo, tmp_path, monkeypatch):
+    monkeypatch.setattr(daemon, "REPLY_TIMEOUT", 0.1)
+    path = str(tmp_path / "hung.sock")
+    with socket.socket(socket.AF_UNIX) as hung:
+        hung.bind(path)
+        hung.listen()  # Accepts connections but never replies
+        os.chmod(path, 0o600)
+        assert request_diff(DiffConfig(repo=str(staged_repo)), path=path) is None
+
+
+def test_output_streamed_in_chunks(staged_repo, server, monkeypatch):
+    monkeypatch.setattr(daemon, "OUTPUT_CHUNK", 16)
+    config = DiffConfig(repo=str(staged_repo), plain=True)
+    for _ in range(2):  # Rendered, then from the memo
+        chunks = list(request_diff(config, path=server.server_address))
+        assert len(chunks) > 1 and all(len(chunk) <= 16 for chunk in chunks)
+        assert b"M: src/mod.py\n" in b"".join(chunks)
+
+
+def test_slow_diff_not_timed_out(staged_repo, server, monkeypatch):
+    monkeypatch.setattr(daemon, "REPLY_TIMEOUT", 0.1)
+    run_diff = DiffServer.run_diff
+
+    def slow_run_diff(*args):
+        time.sleep(0.3)  # Longer than the timeout, but after taking up the request
+        return run_diff(*args)
+
+    monkeypatch.setattr(DiffServer, "run_diff", slow_run_diff)
+    config = DiffConfig(repo=str(staged_repo), plain=True)
+    assert b"".join(request_diff(config, path=server.server_address))
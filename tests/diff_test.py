@@ -1,7 +1,13 @@
+import tracemalloc
+
+from pygit2 import Repository, init_repository
 from pytest import mark
 
-from fugit import diff
+from fugit import diff, iter_diff
+from fugit.core.diffing.logic import iter_diff_infos
+from fugit.core.diffing.pygit2.structures import DiffLine, DiffLines
 from fugit.interfaces import DiffConfig
+from tests.conftest import commit_all, write_files
 
 
 @mark.parametrize("config_cls", [DiffConfig, dict])
@@ -10,3 +16,99 @@ def test_diff_output(config_cls, expected):
     config = config_cls()
     result = diff(config=config)
     assert result == expected
+
+
+def test_iter_diff_infos_is_lazy(staged_repo):
+    repo_diff = Repository(str(staged_repo)).diff("HEAD", cached=True)
+    infos = iter_diff_infos(repo_diff)
+    first = next(infos)
+    assert first.overview == "A: new.txt\n"
+    assert [info.change_type for info in infos] == ["D", "M"]
+
+
+@mark.parametrize(
+    "change_type,expected",
+    [(["D"], ["D"]), (["A", "M"], ["A", "M"]), ([], ["A", "D", "M"])],
+)
+def test_change_type_filters_deltas(staged_repo, change_type, expected):
+    config = DiffConfig(repo=str(staged_repo), change_type=change_type)
+    repo_diff = Repository(config.repo).diff("HEAD", cached=True)
+    infos = iter_diff_infos(repo_diff, config=config)
+    assert [info.change_type for info in infos] == expected
+
+
+def test_hunks_decoded_on_first_access(staged_repo):
+    repo_diff = Repository(str(staged_repo)).diff("HEAD", cached=True)
+    *_, modified = iter_diff_infos(repo_diff)
+    assert "hunks" not in modified.__dict__
+    [hunk] = modified.hunks
+    assert [line.origin for line in hunk.lines] == [" ", "-", "+", " "]
+    assert "hunks" in modified.__dict__
+
+
+def test_hunk_lines_stored_as_columns(staged_repo):
+    repo_diff = Repository(str(staged_repo)).diff("HEAD", cached=True)
+    *_, modified = iter_diff_infos(repo_diff)
+    [hunk] = modified.hunks
+    lines = hunk.lines
+    assert isinstance(lines, DiffLines)
+    assert lines.contents == "a = 1\nb = 2\nb = 20\nc = 3\n"
+    assert lines[-2] == DiffLine("b = 20\n", 6, 2, 1, -1, "+")
+    assert [line.old_lineno for line in lines[1:]] == [2, -1, 3]
+    assert lines == list(lines)
+    assert DiffLines.from_columns(lines.columns()) == lines
+
+
+def test_missing_newline_at_eof(tmp_path):
+    repo = init_repository(tmp_path)
+    write_files(tmp_path, {"f.txt": "a\nb"})
+    commit_all(repo, "Initial commit")
+    write_files(tmp_path, {"f.txt": "a\nc\n"})
+    repo.index.add_all()
+    repo.index.write()
+    [info] = iter_diff(DiffConfig(repo=str(tmp_path)))
+    [hunk] = info.hunks
+    assert hunk.lines.origins == " ->+"
+
+
+@mark.parametrize("grep", [[], ["caf"]])
+def test_invalid_utf8_output_byte_exact(tmp_path, capsysbinary, grep):
+    repo = init_repository(tmp_path)
+    (tmp_path / "latin1.txt").write_bytes(b"cafe\n")
+    commit_all(repo, "Initial commit")
+    (tmp_path / "latin1.txt").write_bytes(b"caf\xe9\n")
+    repo.index.add_all()
+    repo.index.write()
+    for _ in range(2):  # Written to the diff cache, then read back from it
+        diff(repo=str(tmp_path), plain=True, grep=grep)
+        assert capsysbinary.readouterr().out.endswith(b"-cafe\n+caf\xe9\n")
+    [info] = iter_diff(DiffConfig(repo=str(tmp_path)))
+    assert info.text.endswith("+caf\ufffd\n")
+
+
+def test_iter_diff_bypasses_console(staged_repo, capsys):
+    infos = iter_diff(DiffConfig(repo=str(staged_repo), grep=["20"]))
+    assert [info.overview for info in infos] == ["M: src/mod.py\n"]
+    assert capsys.readouterr().out == ""
+
+
+def test_iter_diff_holds_one_file_at_a_time(tmp_path):
+    repo = init_repository(tmp_path)
+    files = {
+        f"m{i}.py": "".join(f"x{n} = {n}\n" for n in range(100)) for i in range(400)
+    }
+    write_files(tmp_path, files)
+    commit_all(repo, "Initial commit")
+    write_files(
+        tmp_path, {name: text.replace(" = ", "=") for name, text in files.items()}
+    )
+    repo.index.add_all()
+    repo.index.write()
+    infos = iter_diff(DiffConfig(repo=str(tmp_path)))
+    next(infos)  # Leave imports and the repo opening out of the measurement
+    tracemalloc.start()
+    sizes = [len(info.text) for info in infos]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(sizes) == 399
+    assert peak < sum(sizes) / 3  # Far below what holding every file would take
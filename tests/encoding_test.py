@@ -0,0 +1,47 @@
+import msgspec
+from pytest import mark
+
+from fugit.core.diffing import load_diff
+from fugit.core.diffing.pygit2 import DiffRecord
+from fugit.interfaces import DiffConfig
+
+
+def test_jsonl_records(staged_repo, capsysbinary):
+    load_diff(DiffConfig(repo=str(staged_repo), output_format="jsonl"))
+    lines = capsysbinary.readouterr().out.splitlines()
+    records = [msgspec.json.decode(line, type=DiffRecord) for line in lines]
+    assert [r.change_type for r in records] == ["A", "D", "M"]
+    [hunk] = records[-1].hunks
+    assert (hunk.old_start, hunk.new_start) == (1, 1)
+    assert [(line.origin, line.new_lineno) for line in hunk.lines[1:3]] == [
+        ("-", -1),
+        ("+", 2),
+    ]
+
+
+@mark.parametrize(
+    "limit,expected", [(2, ["new.txt", "src/gone.py"]), (-1, ["src/mod.py"])]
+)
+def test_msgpack_records(staged_repo, capsysbinary, limit, expected):
+    config = DiffConfig(
+        repo=str(staged_repo), output_format="msgpack", file_limit=limit
+    )
+    load_diff(config)
+    stream = capsysbinary.readouterr().out
+    # Concatenated msgpack objects decode as an array once given a fixarray header
+    array_header = bytes([0x90 | len(expected)])
+    records = msgspec.msgpack.decode(array_header + stream, type=list[DiffRecord])
+    assert [r.delta.new_file.path for r in records] == expected
+
+
+def test_range_records(history_repo, capsysbinary):
+    config = DiffConfig(
+        repo=str(history_repo), range="HEAD~2..HEAD", output_format="jsonl"
+    )
+    load_diff(config)
+    lines = capsysbinary.readouterr().out.splitlines()
+    records = [msgspec.json.decode(line, type=DiffRecord) for line in lines]
+    added = [
+        line.content for r in records for line in r.hunks[0].lines if line.origin == "+"
+    ]
+    assert added == ["x=1\n", "x = 1\n"]  # Each commit's diff, not the empty index diff
@@ -0,0 +1,105 @@
+import msgspec
+from pygit2 import init_repository
+from pytest import mark, raises
+
+from fugit import iter_diff
+from fugit.cli.run import configure
+from fugit.core.diffing.filters import grep_hunks, match_pathspec
+from fugit.core.errors import FugitMisconfigurationExit
+from fugit.core.text.scanning import compile_re
+from fugit.interfaces import DiffConfig
+from tests.conftest import commit_all, write_files
+from tests.io_test import run
+
+PATCH = "--- a/f\n+++ b/f\n@@ -1 +1 @@\n-foo\n+bar\n@@ -9 +9 @@\n baz\n-qux\n+quux\n"
+
+
+@mark.parametrize(
+    "pattern,expected",
+    [
+        ("bar", "--- a/f\n+++ b/f\n@@ -1 +1 @@\n-foo\n+bar\n"),
+        ("quu?x", "--- a/f\n+++ b/f\n@@ -9 +9 @@\n baz\n-qux\n+quux\n"),
+        ("baz", None),  # Only on a context line
+        ("nowhere", None),
+        (r"\Z", None),  # Only after the last line
+    ],
+)
+def test_grep_hunks_keeps_matching_hunks(pattern, expected):
+    assert grep_hunks(PATCH, compile_re(pattern)) == expected
+
+
+def test_grep_selects_files(staged_repo, capsys):
+    run(repo=str(staged_repo), plain=True, grep=["20", "^nothing"])
+    assert capsys.readouterr().out.startswith("M: src/mod.py\n")
+
+
+def test_grep_highlights_matches(staged_repo, capsys):
+    run(repo=str(staged_repo), grep=["20"])
+    out = capsys.readouterr().out
+    assert "+b = \x1b[1m\x1b[33m\x1b[4m20\x1b[0m\x1b[32m\n" in out
+
+
+@mark.parametrize("skip_cache", [True, False])
+def test_grep_narrows_structured_hunks(tmp_path, skip_cache):
+    repo = init_repository(tmp_path)
+    lines = [f"x{i} = {i}\n" for i in range(20)]
+    write_files(tmp_path, {"f.py": "".join(lines)})
+    commit_all(repo, "Initial commit")
+    lines[1], lines[18] = "x1 = -1\n", "x18 = 180\n"
+    write_files(tmp_path, {"f.py": "".join(lines)})
+    repo.index.add_all()
+    repo.index.write()
+    config = DiffConfig(repo=str(tmp_path), grep=["180"], skip_cache=skip_cache)
+    for _ in range(2):  # Filling the cache then reading from it
+        [info] = iter_diff(config)
+        [hunk] = info.hunks
+        assert "+x18 = 180\n" in [line.origin + line.content for line in hunk.lines]
+
+
+def test_invalid_grep_pattern_is_config_error():
+    with raises(FugitMisconfigurationExit):
+        configure(argv=["-g", "("])
+    with raises(msgspec.ValidationError, match="Invalid --grep pattern"):
+        msgspec.convert({"grep": ["("]}, DiffConfig)
+
+
+def test_repeated_list_flags_accumulate():
+    config = configure(argv=["-g", "foo", "bar", "-g", "baz", "-c", "A"])
+    assert isinstance(config, DiffConfig)
+    assert config.grep == ["foo", "bar", "baz"]
+    assert config.change_type == ["A"]
+
+
+@mark.parametrize(
+    "pathspec,expected",
+    [
+        (["src/"], ["D: src/gone.py", "M: src/mod.py"]),
+        (["*.txt", "src/gone.py"], ["A: new.txt", "D: src/gone.py"]),
+        (["docs"], []),
+    ],
+)
+def test_pathspec_limits_diff(staged_repo, capsys, pathspec, expected):
+    run(repo=str(staged_repo), plain=True, pathspec=pathspec)
+    out = capsys.readouterr().out
+    assert [line for line in out.splitlines() if line[1:3] == ": "] == expected
+
+
+@mark.parametrize(
+    "path,spec,matched",
+    [
+        ("src/mod.py", "src/", True),
+        ("src/sub/x.py", "src", True),
+        ("srcs/x.py", "src", False),
+        ("src/sub/x.py", "*.py", True),
+        ("src/mod.py", "src/mod.py", True),
+        ("src/mod.pyc", "src/mod.py", False),
+    ],
+)
+def test_match_pathspec(path, spec, matched):
+    assert match_pathspec(path, [spec]) is matched
+
+
+def test_pathspec_after_double_dash():
+    config = configure(argv=["-n", "--", "src/", "-weird"])
+    assert config.no_pager
+    assert config.pathspec == ["src/", "-weird"]
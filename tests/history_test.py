@@ -0,0 +1,56 @@
+from pygit2 import Repository
+
+from fugit.core.diffing.history import BlobPairPatches, iter_range_diff_infos
+from fugit.interfaces import DiffConfig
+
+
+def test_range_diffs_each_commit(history_repo):
+    repo = Repository(str(history_repo))
+    config = DiffConfig(repo=str(history_repo), range="HEAD~3..HEAD")
+    commits = [
+        (commit.message, [info.text for info in diff_infos])
+        for commit, diff_infos in iter_range_diff_infos(repo, config)
+    ]
+    assert [message for message, _ in commits] == ["Format", "Revert", "Reformat"]
+    assert commits[0][1] == [repo.diff("HEAD~3", "HEAD~2")[0].text]
+
+
+def test_blob_pairs_memoised(history_repo):
+    repo = Repository(str(history_repo))
+    patches = BlobPairPatches(repo)
+    texts = [
+        patches.diff_info(delta).text
+        for rev in ("HEAD~2", "HEAD~1", "HEAD")
+        for delta in repo.diff(f"{rev}~1", rev).deltas
+    ]
+    assert (patches.misses, patches.hits) == (2, 1)
+    assert texts[0] == texts[2]
+
+
+def test_memoised_pair_hunks_rebuilt(history_repo):
+    repo = Repository(str(history_repo))
+    patches = BlobPairPatches(repo)
+    [first, reapplied] = [
+        patches.diff_info(next(repo.diff(f"{rev}~1", rev).deltas))
+        for rev in ("HEAD~2", "HEAD")
+    ]
+    assert patches.hits == 1
+    assert reapplied.hunks == first.hunks != []
+
+
+def test_blob_pair_memo_bounded_by_bytes(history_repo):
+    repo = Repository(str(history_repo))
+    patches = BlobPairPatches(repo, maxbytes=1)
+    for rev in ("HEAD~2", "HEAD~1", "HEAD"):
+        patches.diff_info(next(repo.diff(f"{rev}~1", rev).deltas))
+    assert (patches.misses, patches.hits, patches.size) == (3, 0, 0)
+
+
+def test_range_pathspec_filters_deltas(history_repo):
+    repo = Repository(str(history_repo))
+    for pathspec, expected in [(["*.py"], 3), (["docs/"], 0)]:
+        config = DiffConfig(range="HEAD~3..HEAD", pathspec=pathspec)
+        diffs = [
+            info for _, infos in iter_range_diff_infos(repo, config) for info in infos
+        ]
+        assert len(diffs) == expected
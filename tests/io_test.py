@@ -0,0 +1,56 @@
+from pytest import mark
+
+from fugit.core.diffing import load_diff
+from fugit.interfaces import DiffConfig, configure_global_console
+
+
+def run(**config) -> None:
+    diff_config = DiffConfig(**config)
+    configure_global_console(diff_config)
+    load_diff(diff_config)
+
+
+def test_output_streamed_to_stdout(staged_repo, capsys):
+    run(repo=str(staged_repo), plain=True)
+    out = capsys.readouterr().out
+    assert out.startswith("A: new.txt\n")
+    assert "D: src/gone.py\n" in out
+    assert out.endswith("+b = 20\n c = 3\n")
+
+
+@mark.parametrize("limit,expected", [(1, ["A"]), (2, ["A", "D"])])
+def test_file_limit_stops_output(staged_repo, capsys, limit, expected):
+    run(repo=str(staged_repo), plain=True, file_limit=limit)
+    out = capsys.readouterr().out
+    headers = [line[0] for line in out.splitlines() if line[1:3] == ": "]
+    assert headers == expected
+
+
+def test_quiet_prints_nothing(staged_repo, capsys):
+    run(repo=str(staged_repo), quiet=True)
+    assert capsys.readouterr().out == ""
+
+
+def test_parallel_render_matches_serial(staged_repo, capsys):
+    run(repo=str(staged_repo))
+    serial = capsys.readouterr().out
+    run(repo=str(staged_repo), jobs=2)
+    assert capsys.readouterr().out == serial
+
+
+@mark.parametrize(
+    "limit,expected", [(-1, ["M"]), (-2, ["D", "M"]), (-5, ["A", "D", "M"])]
+)
+def test_negative_file_limit_tails_output(staged_repo, capsys, limit, expected):
+    run(repo=str(staged_repo), plain=True, file_limit=limit)
+    out = capsys.readouterr().out
+    headers = [line[0] for line in out.splitlines() if line[1:3] == ": "]
+    assert headers == expected
+
+
+def test_range_tail_keeps_commit_headers(history_repo, capsys):
+    run(repo=str(history_repo), plain=True, range="HEAD~3..HEAD", file_limit=-1)
+    out = capsys.readouterr().out
+    [commit] = [line for line in out.splitlines() if line.startswith("commit ")]
+    assert commit.endswith(" Reformat")
+    assert out.startswith(commit + "\nM: mod.py\n")
@@ -0,0 +1,65 @@
+from pygit2 import Repository, init_repository
+from pytest import fixture
+
+from fugit import diff, iter_diff
+from fugit.core.diffing.limits import FileGuard
+from fugit.interfaces import DiffConfig
+from tests.conftest import commit_all, write_files
+
+LONG = "".join(f"x{n} = {n}\n" for n in range(100))
+
+
+@fixture
+def large_repo(tmp_path):
+    """A repo with a long file, a binary file and a one-line change staged."""
+    repo = init_repository(tmp_path)
+    write_files(tmp_path, {"small.txt": "a\n"})
+    commit_all(repo, "Initial commit")
+    write_files(tmp_path, {"long.py": LONG, "small.txt": "b\n"})
+    (tmp_path / "blob.bin").write_bytes(bytes(range(256)))
+    repo.index.add_all()
+    repo.index.write()
+    return tmp_path
+
+
+def texts(repo_path, **config) -> dict[str, str]:
+    config = DiffConfig(repo=str(repo_path), **config)
+    return {info.delta.new_file.path: info.text for info in iter_diff(config)}
+
+
+def test_large_file_summarised(large_repo):
+    oid = Repository(str(large_repo)).index["long.py"].id
+    diffs = texts(large_repo, large_file_bytes=len(LONG) - 1)
+    assert diffs["long.py"] == (
+        f"Large file not diffed: 0 -> {len(LONG)} bytes, index 0000000..{str(oid)[:7]}\n"
+    )
+    assert "@@ -1 +1 @@\n-a\n+b\n" in diffs["small.txt"]
+    assert texts(large_repo, large_file_bytes=len(LONG)) == texts(large_repo)
+
+
+def test_line_limit_sniffs_binary(large_repo):
+    diffs = texts(large_repo, large_file_lines=99)
+    assert diffs["long.py"].startswith("Large file not diffed:")
+    assert diffs["blob.bin"].startswith("Binary file not diffed: 0 -> 256 bytes")
+    assert "+x99 = 99\n" in texts(large_repo, large_file_lines=100)["long.py"]
+
+
+def test_skipped_file_has_no_patch(large_repo):
+    repo = Repository(str(large_repo))
+    guard = FileGuard(repo, max_bytes=10)
+    delta = next(iter(repo.diff("HEAD", cached=True).deltas))
+    assert guard.check(delta).diff_info().hunks == []
+
+
+def test_numstat_of_skipped_files(large_repo, capsys):
+    diff(repo=str(large_repo), output_format="numstat", large_file_lines=10)
+    assert capsys.readouterr().out == (
+        "-\t-\tblob.bin\n-\t-\tlong.py\n1\t1\tsmall.txt\n"
+    )
+
+
+def test_range_guarded(large_repo):
+    commit_all(Repository(str(large_repo)), "Add files")
+    config = DiffConfig(repo=str(large_repo), range="HEAD~1..HEAD", large_file_bytes=9)
+    skipped = [info.text.startswith("Large file") for info in iter_diff(config)]
+    assert skipped == [True, True, False]
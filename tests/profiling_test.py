@@ -0,0 +1,41 @@
+import msgspec
+from pytest import approx
+
+from fugit.core.profiling import Profiler, ProfileReport
+from tests.io_test import run
+
+
+def test_nested_phases_charged_exclusively():
+    profiler = Profiler(enabled=True)
+    profiler.start()
+    with profiler.phase("outer"):
+        sum(range(10_000))
+        items = profiler.iterate("inner", iter([1, 2, 3]))
+        assert list(items) == [1, 2, 3]
+    report = profiler.stop()
+    assert list(report.phases) == ["other", "outer", "inner"]
+    assert sum(stats.wall for stats in report.phases.values()) == approx(report.wall)
+
+
+def test_disabled_profiler_passes_through():
+    profiler = Profiler()
+    items = [1, 2]
+    assert profiler.iterate("diff", items) is items
+    profiler.count(files=1)
+    assert profiler.counters == {}
+
+
+def test_profile_written_as_json(staged_repo, tmp_path, capsys):
+    path = tmp_path / "profile.json"
+    run(repo=str(staged_repo), plain=True, skip_cache=True, profile_json=str(path))
+    report = msgspec.json.decode(path.read_bytes(), type=ProfileReport)
+    assert {"open repo", "diff", "convert", "highlight", "render"} <= set(report.phases)
+    assert report.counters["files"] == 3
+    assert report.counters["lines"] == len(capsys.readouterr().out.splitlines())
+
+
+def test_profile_table_on_stderr(staged_repo, capsys):
+    run(repo=str(staged_repo), plain=True, profile=True, profile_memory=True)
+    err = capsys.readouterr().err
+    assert err.startswith("phase ") and "peak (MiB)" in err
+    assert "files: 3" in err
@@ -0,0 +1,46 @@
+import re
+
+from pytest import mark
+
+from fugit.core.diffing.rendering import highlight_diff
+from fugit.core.text.palette import BLUE, BOLD, GREEN, RED, RESET, WHITE
+
+PATCH = (
+    b"diff --git a/f b/f\nindex 1..2 100644\n--- a/f\n+++ b/f\n"
+    b"@@ -1,2 +1,2 @@ def f():\n x\n-y\n+y\n\\ No newline at end of file\n"
+)
+
+
+def strip_styles(data: bytes) -> bytes:
+    return re.sub(rb"\x1b\[[0-9;]*m", b"", data)
+
+
+@mark.parametrize("plain", [True, False])
+def test_highlight_diff_drops_header_lines(plain):
+    line_count, highlighted = highlight_diff(PATCH, plain=plain)
+    assert line_count == 5
+    assert strip_styles(highlighted) == PATCH[PATCH.index(b"@@") :]
+
+
+def test_highlight_diff_styles_each_line():
+    _, highlighted = highlight_diff(PATCH)
+    assert highlighted.decode().split("\n") == [
+        f"{BOLD}{BLUE}@@ -1,2 +1,2 @@{RESET} def f():",
+        f"{RESET}{WHITE} x",
+        f"{RESET}{RED}-y",
+        f"{RESET}{GREEN}+y",
+        f"{RESET}{WHITE}\\ No newline at end of file",
+        RESET,
+    ]
+
+
+def test_highlight_diff_keeps_changed_lines_like_headers():
+    patch = b"@@ -1 +1 @@\n--x\n++x\n"
+    assert highlight_diff(patch, plain=True) == (3, patch)
+
+
+@mark.parametrize("grep", ["", "y"])
+def test_highlight_diff_passes_invalid_utf8_through(grep):
+    patch = b"@@ -1 +1 @@\n-caf\xe9\n+caf\xc3\xa9 y\n"
+    _, highlighted = highlight_diff(patch, grep=grep)
+    assert strip_styles(highlighted) == patch
@@ -0,0 +1,158 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from pygit2 import Repository, init_repository
+from pytest import fixture
+
+from fugit import diff, iter_diff
+from fugit.core.diffing.limits import FileGuard
+from fugit.core.diffing.similarity import (
+    SignatureCache,
+    blob_signature,
+    find_similar,
+    similarity,
+)
+from fugit.interfaces import DiffConfig
+from tests.conftest import commit_all, write_files
+
+LINES = "".join(f"line {n}\n" for n in range(20))
+BASE = "".join(f"base {n}\n" for n in range(20))
+
+
+@fixture
+def moved_repo(tmp_path):
+    """A repo with an edited rename, an exact rename and an edited copy staged."""
+    repo = init_repository(tmp_path)
+    write_files(tmp_path, {"old.txt": LINES, "same.txt": "same\n", "base.txt": BASE})
+    commit_all(repo, "Initial commit")
+    (tmp_path / "old.txt").unlink()
+    (tmp_path / "same.txt").unlink()
+    write_files(
+        tmp_path,
+        {
+            "new.txt": LINES.replace("line 3\n", "line three\n"),
+            "moved.txt": "same\n",
+            "base.txt": BASE + "edit\n",
+            "copy.txt": BASE + "extra\n",
+        },
+    )
+    repo.index.add_all()
+    repo.index.write()
+    return tmp_path
+
+
+def overviews(repo_path, **config) -> list[str]:
+    config = DiffConfig(repo=str(repo_path), **config)
+    return [info.overview for info in iter_diff(config)]
+
+
+def test_not_detected_by_default(moved_repo):
+    assert overviews(moved_repo) == [
+        "M: base.txt\n",
+        "A: copy.txt\n",
+        "A: moved.txt\n",
+        "A: new.txt\n",
+        "D: old.txt\n",
+        "D: same.txt\n",
+    ]
+
+
+def test_renames_and_copies_detected(moved_repo):
+    infos = list(
+        iter_diff(
+            DiffConfig(
+                repo=str(moved_repo), rename_threshold=50, rename_copy_threshold=50
+            )
+        )
+    )
+    assert [info.overview for info in infos] == [
+        "M: base.txt\n",
+        "C: base.txt -> copy.txt\n",
+        "R: same.txt -> moved.txt\n",
+        "R: old.txt -> new.txt\n",
+    ]
+    assert "similarity index 95%\nrename from old.txt\n" in infos[3].text
+    assert "-line 3\n+line three\n" in infos[3].text
+
+
+def test_exact_renames_need_no_signatures(moved_repo):
+    repo = Repository(str(moved_repo))
+    deltas = repo.diff("HEAD", cached=True).deltas
+    signatures = SignatureCache(repo)
+    config = DiffConfig(rename_threshold=50, rename_limit=0)
+    found = [
+        delta.status_char() for _, delta in find_similar(deltas, config, signatures)
+    ]
+    assert found == ["M", "A", "R", "A", "D"]
+    assert signatures.misses == 0
+
+
+def test_guarded_blobs_not_searched(moved_repo):
+    repo = Repository(str(moved_repo))
+    deltas = repo.diff("HEAD", cached=True).deltas
+    signatures = SignatureCache(repo)
+    config = DiffConfig(rename_threshold=50, large_file_bytes=len(LINES) - 1)
+    guard = FileGuard.from_config(repo, config)
+    found = [
+        delta.status_char()
+        for _, delta in find_similar(deltas, config, signatures, guard)
+    ]
+    assert found == ["M", "A", "R", "A", "D"]  # Only the exact rename is paired
+    assert signatures.misses == 0
+
+
+def test_signatures_cached_on_disk(moved_repo, tmp_path_factory):
+    repo = Repository(str(moved_repo))
+    deltas = list(repo.diff("HEAD", cached=True).deltas)
+    root = tmp_path_factory.mktemp("signatures")
+    config = DiffConfig(rename_threshold=50)
+    for expected in [(0, 3), (3, 0)]:
+        signatures = SignatureCache(repo, root)
+        find_similar(deltas, config, signatures)
+        signatures.save()
+        assert (signatures.hits, signatures.misses) == expected
+
+
+def test_similarity_counts_common_lines():
+    assert (
+        similarity(blob_signature(b"a\nb\nc\nd\n"), blob_signature(b"a\nb\nc\n")) == 75
+    )
+    assert similarity(blob_signature(b""), blob_signature(b"")) == 100
+
+
+def test_range_renames(moved_repo):
+    commit_all(Repository(str(moved_repo)), "Move")
+    assert overviews(moved_repo, range="HEAD~1..HEAD", rename_threshold=50) == [
+        "M: base.txt\n",
+        "A: copy.txt\n",
+        "R: same.txt -> moved.txt\n",
+        "R: old.txt -> new.txt\n",
+    ]
+
+
+def test_stat_shows_renames(moved_repo, capsys):
+    diff(repo=str(moved_repo), output_format="numstat", rename_threshold=50)
+    assert capsys.readouterr().out.splitlines()[-1] == "1\t1\told.txt => new.txt"
+
+
+def test_concurrent_signature_saves(moved_repo, tmp_path_factory):
+    repo = Repository(str(moved_repo))
+    deltas = list(repo.diff("HEAD", cached=True).deltas)
+    root = tmp_path_factory.mktemp("signatures")
+    caches = [SignatureCache(repo, root) for _ in range(8)]
+    for signatures in caches:
+        find_similar(deltas, DiffConfig(rename_threshold=50), signatures)
+    with ThreadPoolExecutor() as pool:
+        list(pool.map(SignatureCache.save, caches))
+    assert not list(root.glob("*.tmp"))
+    signatures = SignatureCache(repo, root)
+    find_similar(deltas, DiffConfig(rename_threshold=50), signatures)
+    assert (signatures.hits, signatures.misses) == (3, 0)
+
+
+def test_unwritable_signature_cache(moved_repo, tmp_path):
+    repo = Repository(str(moved_repo))
+    deltas = list(repo.diff("HEAD", cached=True).deltas)
+    (tmp_path / "file").touch()
+    signatures = SignatureCache(repo, tmp_path / "file" / "signatures")
+    find_similar(deltas, DiffConfig(rename_threshold=50), signatures)
+    signatures.save()  # Not a dir, so the signatures just aren't kept
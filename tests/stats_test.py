@@ -0,0 +1,59 @@
+import msgspec
+from pygit2 import init_repository
+from pytest import raises
+
+from fugit.core.diffing import load_diff
+from fugit.core.diffing.stats import FileStat, render_stat
+from fugit.interfaces import DiffConfig, configure_global_console
+from tests.conftest import commit_all, write_files
+
+
+def run(capsys, **config) -> str:
+    diff_config = DiffConfig(**config)
+    configure_global_console(diff_config)
+    load_diff(diff_config)
+    return capsys.readouterr().out
+
+
+def test_numstat(staged_repo, capsys):
+    out = run(capsys, repo=str(staged_repo), output_format="numstat")
+    assert out == "1\t0\tnew.txt\n0\t1\tsrc/gone.py\n1\t1\tsrc/mod.py\n"
+
+
+def test_stat(staged_repo, capsys):
+    out = run(capsys, repo=str(staged_repo), output_format="stat", plain=True)
+    assert out.splitlines() == [
+        " new.txt     | 1 +",
+        " src/gone.py | 1 -",
+        " src/mod.py  | 2 +-",
+        " 3 files changed, 2 insertions(+), 2 deletions(-)",
+    ]
+
+
+def test_grep_numstat_counts_matching_hunks(tmp_path, capsys):
+    repo = init_repository(tmp_path)
+    lines = [f"line {n}\n" for n in range(20)]
+    write_files(tmp_path, {"f.txt": "".join(lines)})
+    commit_all(repo, "Initial commit")
+    lines[1], lines[18] = "one\n", "eighteen\n"  # Far enough apart for two hunks
+    write_files(tmp_path, {"f.txt": "".join(lines)})
+    repo.index.add_all()
+    repo.index.write()
+    config = {"repo": str(tmp_path), "output_format": "numstat"}
+    assert run(capsys, **config) == "2\t2\tf.txt\n"
+    assert run(capsys, **config, grep=["eight"]) == "1\t1\tf.txt\n"
+    assert run(capsys, **config, grep=["nine"]) == ""
+
+
+def test_range_stat_is_config_error():
+    with raises(msgspec.ValidationError, match="--range isn't supported"):
+        msgspec.convert({"range": "HEAD~1..HEAD", "output_format": "stat"}, DiffConfig)
+
+
+def test_stat_scaled_to_width():
+    stats = [FileStat("a" * 100, 300, 100, False), FileStat("b", 1, 0, False)]
+    lines = render_stat(stats, width=80, plain=True)
+    assert all(len(line.rstrip("\n")) <= 80 for line in lines)
+    assert lines[0].startswith(" ...")
+    assert (lines[0].count("+"), lines[0].count("-")) == (16, 6)
+    assert lines[1].endswith("|   1 +\n")
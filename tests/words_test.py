@@ -0,0 +1,66 @@
+import re
+
+from pygit2 import init_repository
+
+from fugit import diff
+from fugit.core.diffing.rendering import highlight_diff
+from fugit.core.diffing.words import MAX_LINE_LENGTH, changed_spans, highlight_words
+from fugit.core.text.palette import GREEN, RED, RESET
+from tests.conftest import commit_all, write_files
+
+ON = "\x1b[7m"
+
+
+def marked(old: bytes, new: bytes) -> tuple[list[bytes], list[bytes]]:
+    old_spans, new_spans = changed_spans(old, new)
+    return (
+        [old[span.start : span.stop] for span in old_spans],
+        [new[span.start : span.stop] for span in new_spans],
+    )
+
+
+def test_changed_words_marked():
+    assert marked(b"x=1", b"x = 1") == ([], [b" ", b" "])
+    assert marked(b"f('a', b)", b'f("a", b)') == ([b"'", b"'"], [b'"', b'"'])
+    assert marked(b"value_1 = 2", b"value_2 = 2") == ([b"value_1"], [b"value_2"])
+    assert marked(b"abc", b"xyz") == ([], [])  # Rewritten, so left whole
+
+
+def test_multibyte_characters_kept_whole():
+    assert marked("café x".encode(), "cafè x".encode()) == (
+        ["café".encode()],
+        ["cafè".encode()],
+    )
+
+
+def test_paired_lines_styled():
+    body = b"@@ -1,3 +1,3 @@\n-x=1\n-y\n+x = 1\n+z\n c\n"
+    _, highlighted = highlight_diff(body, words=True)
+    lines = highlighted.decode().split("\n")
+    assert lines[1:5] == [
+        f"{RESET}{RED}-x=1",
+        f"{RESET}{RED}-y",
+        f"{RESET}{GREEN}+x{ON} {RESET}{GREEN}={ON} {RESET}{GREEN}1",
+        f"{RESET}{GREEN}+z",
+    ]
+    assert re.sub(rb"\x1b\[[0-9;]*m", b"", highlighted) == body
+
+
+def test_unpaired_and_long_lines_left_whole():
+    unpaired = b"-x=1\n+x = 1\n+y\n"
+    long_line = b"-x=1" + b" " * MAX_LINE_LENGTH + b"\n+x = 1\n"
+    assert highlight_words(unpaired) == unpaired
+    assert highlight_words(long_line) == long_line
+
+
+def test_word_diff_output(tmp_path, capsysbinary):
+    repo = init_repository(tmp_path)
+    write_files(tmp_path, {"f.py": "f(x=1)\n"})
+    commit_all(repo, "Initial commit")
+    (tmp_path / "f.py").write_bytes(b"f(x = 1)  # caf\xe9\n")
+    repo.index.add_all()
+    repo.index.write()
+    diff(repo=str(tmp_path), word_diff=True)
+    assert f"+f(x{ON} {RESET}{GREEN}={ON} {RESET}{GREEN}1)".encode() in (
+        capsysbinary.readouterr().out
+    )